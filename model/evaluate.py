@@ -0,0 +1,223 @@
+import argparse
+import csv
+import os
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from torch.utils.data import DataLoader
+
+from model import load_model
+from taiko_dataset import TaikoDataset, pad_collate
+from train import AUDIO_ROOT, LABEL_ROOT, split_dataset, check_prediction_shape, unwrap
+
+NOTE_TYPES = {1: "don", 2: "ka", 3: "DON", 4: "KA", 5: "roll", 6: "ROLL", 7: "balloon", 8: "roll end", 9: "kusudama"}
+
+def peak_pick(activation, threshold=0.5, window=1):
+    """Indices of local maxima (within +/- window steps) that reach threshold."""
+    pooled = F.max_pool1d(activation.view(1, 1, -1), kernel_size=2 * window + 1, stride=1, padding=window).view(-1)
+    peaks = (activation >= threshold) & (activation == pooled)
+    return peaks.nonzero().view(-1)
+
+def collect_events(model, loader, device, threshold=0.5, window=1):
+    """
+    Runs the model over loader and returns reference and estimated note events
+    as flat arrays (song, step, note type). Steps are model output steps
+    (LABEL_STRIDE mel frames each), shared by labels and predictions.
+    """
+    model.eval()
+    ref = {"song": [], "time": [], "type": []}
+    est = {"song": [], "time": [], "type": []}
+    max_type = max(NOTE_TYPES)
+    song = 0
+
+    with torch.no_grad():
+        for audio_batch, label_batch, audio_lengths, label_lengths in loader:
+            audio_batch = audio_batch.to(device)
+            label_batch = label_batch.float().to(device)
+
+            preds = model(audio_batch, audio_lengths)
+            check_prediction_shape(preds, label_batch)
+            valid_lengths = torch.minimum(label_lengths, unwrap(model).output_lengths(audio_lengths))
+
+            for b in range(label_batch.size(0)):
+                n = int(valid_lengths[b])
+                labels = label_batch[b, :n].reshape(-1)
+                activation = preds[b, :n].reshape(-1)
+
+                ref_steps = labels.nonzero().view(-1)
+                est_steps = peak_pick(activation, threshold, window)
+                # The model regresses the note symbol, so the nearest symbol is the predicted type
+                est_types = activation[est_steps].round().clamp(1, max_type)
+
+                ref["song"].append(np.full(len(ref_steps), song))
+                ref["time"].append(ref_steps.cpu().numpy())
+                ref["type"].append(labels[ref_steps].long().cpu().numpy())
+                est["song"].append(np.full(len(est_steps), song))
+                est["time"].append(est_steps.cpu().numpy())
+                est["type"].append(est_types.long().cpu().numpy())
+                song += 1
+
+    def stack(events):
+        return {k: np.concatenate(v).astype(np.int64) if v else np.zeros(0, dtype=np.int64) for k, v in events.items()}
+
+    return stack(ref), stack(est), song
+
+def _match_sorted(ref_keys, est_keys, tolerance):
+    """
+    Maximum one-to-one matching of two sorted key lists within tolerance: every
+    estimate takes the earliest reference still free in its window. With equal
+    windows nothing can do better, since a later estimate's window never ends earlier.
+    """
+    pairs = []
+    i = j = 0
+    while i < len(ref_keys) and j < len(est_keys):
+        if ref_keys[i] < est_keys[j] - tolerance:
+            i += 1
+        elif ref_keys[i] > est_keys[j] + tolerance:
+            j += 1
+        else:
+            pairs.append((i, j))
+            i += 1
+            j += 1
+    return pairs
+
+def match_events(ref_times, ref_groups, est_times, est_groups, tolerance):
+    """
+    Maximum one-to-one matching of estimated to reference events within tolerance,
+    never across groups. All songs/types go through one sorted axis, with each
+    group shifted onto its own stretch. Wherever consecutive events are more than
+    tolerance apart nothing can match across the gap, which cuts the axis into
+    clusters; a cluster of one ref and one est is a hit outright, and only
+    clusters with competing events are matched one by one.
+    Returns boolean hit masks for ref and est.
+    """
+    ref_hit = np.zeros(len(ref_times), dtype=bool)
+    est_hit = np.zeros(len(est_times), dtype=bool)
+    if len(ref_times) == 0 or len(est_times) == 0:
+        return ref_hit, est_hit
+
+    shift = max(ref_times.max(), est_times.max()) + 2 * tolerance + 1
+    keys = np.concatenate([ref_times + ref_groups * shift, est_times + est_groups * shift])
+    is_est = np.concatenate([np.zeros(len(ref_times), dtype=bool), np.ones(len(est_times), dtype=bool)])
+    index = np.concatenate([np.arange(len(ref_times)), np.arange(len(est_times))])
+
+    order = np.argsort(keys, kind="stable")
+    keys, is_est, index = keys[order], is_est[order], index[order]
+
+    cluster = np.concatenate([[0], np.cumsum(np.diff(keys) > tolerance)])
+    n_est = np.bincount(cluster, weights=is_est.astype(np.float64)).astype(np.int64)
+    n_ref = np.bincount(cluster) - n_est
+
+    # Two neighbours within tolerance of each other
+    single = ((n_ref == 1) & (n_est == 1))[cluster]
+    ref_hit[index[single & ~is_est]] = True
+    est_hit[index[single & is_est]] = True
+
+    contested = np.nonzero((n_ref > 0) & (n_est > 0) & ((n_ref > 1) | (n_est > 1)))[0]
+    starts = np.searchsorted(cluster, contested, side="left")
+    ends = np.searchsorted(cluster, contested, side="right")
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        c_keys, c_est, c_index = keys[start:end], is_est[start:end], index[start:end]
+        ref_index, est_index = c_index[~c_est], c_index[c_est]
+        pairs = _match_sorted(c_keys[~c_est].tolist(), c_keys[c_est].tolist(), tolerance)
+        if pairs:
+            i, j = np.array(pairs).T
+            ref_hit[ref_index[i]] = True
+            est_hit[est_index[j]] = True
+    return ref_hit, est_hit
+
+def prf(tp, n_ref, n_est):
+    tp, n_ref, n_est = (np.asarray(x, dtype=np.float64) for x in (tp, n_ref, n_est))
+    precision = np.divide(tp, n_est, out=np.zeros_like(tp), where=n_est > 0)
+    recall = np.divide(tp, n_ref, out=np.zeros_like(tp), where=n_ref > 0)
+    f1 = np.divide(2 * precision * recall, precision + recall, out=np.zeros_like(tp), where=(precision + recall) > 0)
+    return precision, recall, f1
+
+def onset_f1(ref, est, num_songs, tolerance=1):
+    """
+    Precision/recall/F1 overall (any note type), per note type and per song.
+    A typed hit needs the right note type at the right time.
+    """
+    num_types = max(NOTE_TYPES) + 1
+
+    # Onsets regardless of type, matched within each song
+    ref_hit, est_hit = match_events(ref["time"], ref["song"], est["time"], est["song"], tolerance)
+    song_tp = np.bincount(ref["song"][ref_hit], minlength=num_songs)
+    song_ref = np.bincount(ref["song"], minlength=num_songs)
+    song_est = np.bincount(est["song"], minlength=num_songs)
+
+    # Typed onsets, matched within each (song, type)
+    ref_hit_t, _ = match_events(ref["time"], ref["song"] * num_types + ref["type"],
+                                est["time"], est["song"] * num_types + est["type"], tolerance)
+    type_tp = np.bincount(ref["type"][ref_hit_t], minlength=num_types)
+    type_ref = np.bincount(ref["type"], minlength=num_types)
+    type_est = np.bincount(est["type"], minlength=num_types)
+
+    overall = prf(song_tp.sum(), song_ref.sum(), song_est.sum())
+    typed = prf(type_tp.sum(), type_ref.sum(), type_est.sum())
+    per_type = prf(type_tp, type_ref, type_est)
+    per_song = prf(song_tp, song_ref, song_est)
+
+    return {
+        "overall": dict(zip(("precision", "recall", "f1"), (float(x) for x in overall))),
+        "typed": dict(zip(("precision", "recall", "f1"), (float(x) for x in typed))),
+        "per_type": {
+            name: {"precision": float(per_type[0][t]), "recall": float(per_type[1][t]), "f1": float(per_type[2][t]),
+                   "support": int(type_ref[t])}
+            for t, name in NOTE_TYPES.items()
+        },
+        "per_song": {
+            "precision": per_song[0], "recall": per_song[1], "f1": per_song[2],
+            "support": song_ref, "predicted": song_est,
+        },
+    }
+
+def evaluate_loader(model, loader, device, threshold=0.5, window=1, tolerance=1):
+    ref, est, num_songs = collect_events(model, loader, device, threshold, window)
+    return onset_f1(ref, est, num_songs, tolerance)
+
+def print_report(scores):
+    o, t = scores["overall"], scores["typed"]
+    print(f"🎯 Onsets     P={o['precision']:.3f} R={o['recall']:.3f} F1={o['f1']:.3f}")
+    print(f"🥁 Typed      P={t['precision']:.3f} R={t['recall']:.3f} F1={t['f1']:.3f}")
+    for name, s in scores["per_type"].items():
+        if s["support"]:
+            print(f"   {name:<9} P={s['precision']:.3f} R={s['recall']:.3f} F1={s['f1']:.3f} (n={s['support']})")
+
+def write_song_report(scores, song_names, path):
+    per_song = scores["per_song"]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["song", "precision", "recall", "f1", "support", "predicted"])
+        for i, name in enumerate(song_names):
+            writer.writerow([name, f"{per_song['precision'][i]:.4f}", f"{per_song['recall'][i]:.4f}",
+                             f"{per_song['f1'][i]:.4f}", int(per_song["support"][i]), int(per_song["predicted"][i])])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Onset precision/recall/F1 on the test split")
+    parser.add_argument("--checkpoint", default="checkpoints/best_model.pth")
+    parser.add_argument("--threshold", type=float, default=0.5, help="Minimum activation for a peak")
+    parser.add_argument("--window", type=int, default=1, help="Peak must be the max within +/- this many steps")
+    parser.add_argument("--tolerance", type=int, default=1, help="Match window in output steps (4 mel frames each)")
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--csv", default="onset_f1_per_song.csv")
+    parser.add_argument("--audio-root", default=AUDIO_ROOT)
+    parser.add_argument("--label-root", default=LABEL_ROOT)
+    args = parser.parse_args()
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    full_dataset = TaikoDataset(audio_root=args.audio_root, label_root=args.label_root)
+    _, _, test_dataset = split_dataset(full_dataset)
+    test_loader = DataLoader(test_dataset, batch_size=args.batch_size, shuffle=False, collate_fn=pad_collate)
+    print(f"🧪 Evaluating {len(test_dataset)} test songs")
+
+    model = load_model(args.checkpoint, map_location=device)
+    model.to(device)
+
+    scores = evaluate_loader(model, test_loader, device, args.threshold, args.window, args.tolerance)
+    print_report(scores)
+
+    song_names = [os.path.relpath(full_dataset.audio_files[i], args.audio_root) for i in test_dataset.indices]
+    write_song_report(scores, song_names, args.csv)
+    print(f"📁 Per-song scores written to {args.csv}")
@@ -0,0 +1,196 @@
+import argparse
+import hashlib
+import math
+import os
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from pathlib import Path
+
+import torch
+
+from model import load_model
+from evaluate import peak_pick
+from taiko_dataset import LABEL_STRIDE
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from taiko_cli import load_script
+
+audio_parser = load_script("parser/audio-parser.py")
+# SAMPLE_RATE/HOP_LENGTH: the mel frame grid the predictions are on
+tja_parser = load_script("parser/tja-parser.py")
+
+# Set once per worker process by _init_worker
+_model = None
+_model_hash = None
+
+def hash_file(path, block_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _init_worker(checkpoint_path, model_hash, threads):
+    global _model, _model_hash
+    torch.set_num_threads(threads)
+    _model = load_model(checkpoint_path)
+    _model.eval()
+    _model_hash = model_hash
+
+def predict_cached(audio_path, cache_dir):
+    """Raw per-step predictions for one song, keyed by (audio hash, model hash) on disk."""
+    audio_hash = hash_file(audio_path)
+    cache_path = os.path.join(cache_dir, _model_hash[:16], audio_hash + ".pt")
+    if os.path.exists(cache_path):
+        return torch.load(cache_path), True
+
+    mel = audio_parser.extract_mel_spectrogram_chunked(audio_path)
+    with torch.no_grad():
+        preds = _model(mel.unsqueeze(0))[0]
+
+    # Write then rename, so an interrupted run never leaves a half-written entry
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = cache_path + f".{os.getpid()}.tmp"
+    torch.save(preds, tmp_path)
+    os.replace(tmp_path, cache_path)
+    return preds, False
+
+def preds_to_measures(preds, bpm, offset=0.0, division=48, threshold=0.5, window=1):
+    """
+    Peak-picks the per-step predictions and snaps each note onto a grid of 4/4
+    measures with `division` slots each. The first measure starts OFFSET
+    seconds before the audio, as in the .tja format.
+    """
+    activation = preds.reshape(-1)
+    step_seconds = LABEL_STRIDE * tja_parser.HOP_LENGTH / tja_parser.SAMPLE_RATE
+    measure_seconds = 240.0 / bpm
+
+    peaks = peak_pick(activation, threshold, window)
+    types = activation[peaks].round().clamp(1, 9).long()
+    slots = torch.round((peaks.double() * step_seconds + offset) / measure_seconds * division).long()
+
+    num_measures = max(1, math.ceil((len(activation) * step_seconds + offset) / measure_seconds))
+    grid = torch.zeros(num_measures * division, dtype=torch.long)
+    keep = (slots >= 0) & (slots < len(grid))
+    # Two peaks snapping to one slot keep the higher symbol
+    grid.scatter_reduce_(0, slots[keep], types[keep], reduce="amax")
+    return grid.view(num_measures, division).tolist()
+
+def write_tja(output_path, title, wave, measures, bpm, offset, course="Oni", level=8):
+    lines = [
+        f"TITLE:{title}",
+        f"BPM:{bpm}",
+        f"WAVE:{wave}",
+        f"OFFSET:{offset}",
+        "",
+        f"COURSE:{course}",
+        f"LEVEL:{level}",
+        "",
+        "#START",
+    ]
+    lines += ["".join(str(n) for n in measure) + "," for measure in measures]
+    lines.append("#END")
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+def generate_chart(audio_path, audio_root, output_root, cache_dir, params):
+    preds, cached = predict_cached(audio_path, cache_dir)
+
+    measures = preds_to_measures(preds, params["bpm"], params["offset"], params["division"],
+                                 params["threshold"], params["window"])
+
+    rel = Path(audio_path).relative_to(audio_root)
+    output_path = Path(output_root) / rel.with_suffix(".tja")
+    # The audio stays where it is, so WAVE points back at it from the chart's folder
+    wave = os.path.relpath(audio_path, output_path.parent)
+    write_tja(str(output_path), rel.stem, wave, measures, params["bpm"], params["offset"],
+              params["course"], params["level"])
+    return str(output_path), cached
+
+def find_audio_files(audio_root, extensions=(".wav",)):
+    audio_files = []
+    for root, _, files in os.walk(audio_root):
+        for file in files:
+            if file.lower().endswith(extensions):
+                audio_files.append(os.path.join(root, file))
+    return sorted(audio_files)
+
+def load_song_timing(catalog_path):
+    """
+    BPM/OFFSET per audio file from a tja-index.py catalog, keyed by the WAVE
+    path without its extension (the .ogg a chart names is converted to .wav).
+    """
+    conn = sqlite3.connect(catalog_path)
+    rows = conn.execute("SELECT path, wave, bpm, offset FROM songs WHERE wave IS NOT NULL AND bpm > 0").fetchall()
+    conn.close()
+    timing = {}
+    for path, wave, bpm, offset in rows:
+        key = os.path.splitext(os.path.join(os.path.dirname(path), wave))[0]
+        timing[os.path.normcase(key)] = {"bpm": bpm, "offset": offset or 0.0}
+    return timing
+
+def generate_library(audio_root, output_root, checkpoint_path, cache_dir="prediction_cache", workers=4, params=None,
+                     catalog_path=None):
+    # 48 slots per 4/4 measure is finer than a model step (~93 ms) above 54 BPM
+    params = dict({"bpm": 120, "offset": 0, "division": 48, "threshold": 0.5, "window": 1, "course": "Oni", "level": 8}, **(params or {}))
+    audio_files = find_audio_files(audio_root)
+    model_hash = hash_file(checkpoint_path)
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    print(f"🎵 {len(audio_files)} song(s), model {model_hash[:12]}, {workers} worker(s) x {threads} thread(s)")
+
+    # Songs with a catalogued chart get its tempo; the rest use the --bpm/--offset defaults
+    timing = load_song_timing(catalog_path) if catalog_path else {}
+    keys = {path: os.path.normcase(os.path.splitext(os.path.abspath(path))[0]) for path in audio_files}
+    song_params = {path: dict(params, **timing.get(keys[path], {})) for path in audio_files}
+    if catalog_path:
+        print(f"📚 Tempo from {catalog_path} for {sum(keys[p] in timing for p in audio_files)} song(s)")
+
+    generated = cached = failed = 0
+    ctx = get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                             initargs=(checkpoint_path, model_hash, threads)) as executor:
+        futures = {
+            executor.submit(generate_chart, path, audio_root, output_root, cache_dir, song_params[path]): path
+            for path in audio_files
+        }
+        for future in as_completed(futures):
+            try:
+                output_path, from_cache = future.result()
+            except Exception as e:
+                print(f"❌ Error generating {futures[future]}: {e}")
+                failed += 1
+                continue
+            generated += 1
+            cached += from_cache
+            print(f"{'♻️ ' if from_cache else '✅'} {output_path}")
+
+    print("\n✅ Done!")
+    print(f"🥁 Charts written: {generated}")
+    print(f"♻️  Predictions reused from cache: {cached}")
+    print(f"❌ Failed: {failed}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate .tja charts for a whole audio library")
+    parser.add_argument("audio_root")
+    parser.add_argument("output_root")
+    parser.add_argument("--checkpoint", default="taiko_model_final.pth")
+    parser.add_argument("--cache-dir", default="prediction_cache")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--catalog", help="tja-index.py catalog to take each song's BPM/OFFSET from")
+    parser.add_argument("--bpm", type=float, default=120, help="For songs the catalog doesn't cover")
+    parser.add_argument("--offset", type=float, default=0, help="For songs the catalog doesn't cover")
+    parser.add_argument("--division", type=int, default=48, help="Note slots per measure")
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--window", type=int, default=1)
+    parser.add_argument("--course", default="Oni")
+    parser.add_argument("--level", type=int, default=8)
+    args = parser.parse_args()
+
+    generate_library(args.audio_root, args.output_root, args.checkpoint, cache_dir=args.cache_dir, workers=args.workers,
+                     catalog_path=args.catalog,
+                     params={"bpm": args.bpm, "offset": args.offset, "division": args.division, "threshold": args.threshold,
+                             "window": args.window, "course": args.course, "level": args.level})
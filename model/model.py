@@ -1,5 +1,6 @@
 import torch
 import torch.nn as nn
+from torch.nn.utils.rnn import pack_padded_sequence, pad_packed_sequence
 
 class TaikoModel(nn.Module):
     def __init__(self, input_channels=1, n_mels=128, hidden_size=256, num_layers=2, output_dim=48):
@@ -29,11 +30,63 @@ class TaikoModel(nn.Module):
 
         self.fc = nn.Linear(hidden_size * 2, output_dim)
 
-    def forward(self, x):
+    def output_lengths(self, lengths):
+        # Time is the last spatial dim, so follow index 1 of each layer's (H, W) params
+        lengths = lengths.clone()
+        for layer in self.cnn:
+            if isinstance(layer, (nn.Conv2d, nn.MaxPool2d)):
+                k, s, p = (layer.kernel_size, layer.stride, layer.padding)
+                k = k[1] if isinstance(k, tuple) else k
+                s = s[1] if isinstance(s, tuple) else s
+                p = p[1] if isinstance(p, tuple) else p
+                lengths = torch.div(lengths + 2 * p - k, s, rounding_mode='floor') + 1
+        return lengths
+
+    def forward(self, x, lengths=None, state=None, return_state=False):
         batch_size, _, _, time_steps = x.size()
         x = self.cnn(x)
         x = x.permute(0, 3, 1, 2)
         x = x.contiguous().view(batch_size, x.size(1), -1)
-        rnn_out, _ = self.rnn(x)
+
+        if lengths is None:
+            rnn_out, new_state = self.rnn(x, state)
+        else:
+            # Pack so padded frames get no recurrent compute and never reach the backward direction
+            out_lengths = self.output_lengths(lengths).clamp(min=1, max=x.size(1))
+            packed = pack_padded_sequence(x, out_lengths.cpu(), batch_first=True, enforce_sorted=False)
+            packed_out, new_state = self.rnn(packed, state)
+            rnn_out, _ = pad_packed_sequence(packed_out, batch_first=True, total_length=x.size(1))
+
         out = self.fc(rnn_out)
+        if return_state:
+            return out, new_state
         return out
+
+    def carry_state(self, state, reset=None):
+        """
+        Turns the final (h, c) of one window into the initial state of the next
+        for truncated BPTT: detached, backward direction cleared (it cannot see
+        the next window), and batch slots flagged in reset cleared.
+        """
+        h, c = (s.detach().clone() for s in state)
+        # Rows are [layer0 fwd, layer0 bwd, layer1 fwd, ...]
+        h[1::2] = 0
+        c[1::2] = 0
+        if reset is not None:
+            h[:, reset] = 0
+            c[:, reset] = 0
+        return h, c
+
+def load_model(checkpoint_path, map_location="cpu"):
+    """Rebuilds a TaikoModel from a training checkpoint or a bare state dict, inferring its sizes."""
+    checkpoint = torch.load(checkpoint_path, map_location=map_location)
+    state = checkpoint.get("model_state_dict", checkpoint)
+
+    hidden_size = state["rnn.weight_hh_l0"].shape[1]
+    num_layers = sum(1 for k in state if k.startswith("rnn.weight_ih_l") and not k.endswith("_reverse"))
+    n_mels = state["rnn.weight_ih_l0"].shape[1] // 64 * 4
+    output_dim = state["fc.weight"].shape[0]
+
+    model = TaikoModel(n_mels=n_mels, hidden_size=hidden_size, num_layers=num_layers, output_dim=output_dim)
+    model.load_state_dict(state)
+    return model
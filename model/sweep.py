@@ -0,0 +1,146 @@
+import argparse
+import csv
+import itertools
+import multiprocessing
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import torch
+from torch.utils.data import DataLoader
+
+from model import TaikoModel
+from taiko_dataset import TaikoDataset, CachedTaikoDataset, build_feature_cache, pad_collate, LABEL_DIM
+from train import AUDIO_ROOT, LABEL_ROOT, split_dataset, fit
+
+RESULT_FIELDS = ["trial", "hidden_size", "num_layers", "lr", "batch_size", "status", "best_val_loss", "epochs", "seconds"]
+
+def should_prune(history, trial_id, epoch, val_loss, warmup_epochs, min_trials):
+    """Median pruning: stop if this epoch's loss is worse than the median of other trials at the same epoch."""
+    if epoch < warmup_epochs:
+        return False
+    others = [losses[epoch] for tid, losses in history.items() if tid != trial_id and len(losses) > epoch]
+    if len(others) < min_trials:
+        return False
+    return val_loss > statistics.median(others)
+
+def run_trial(trial_id, params, cache_dir, sweep_dir, num_epochs, patience, threads, history, warmup_epochs, min_trials):
+    torch.set_num_threads(threads)
+    start = time.perf_counter()
+
+    # Every trial maps the same cache files read-only; the OS shares the pages
+    dataset = CachedTaikoDataset(cache_dir)
+    train_dataset, val_dataset, _ = split_dataset(dataset)
+
+    train_loader = DataLoader(train_dataset, batch_size=params["batch_size"], shuffle=True, collate_fn=pad_collate)
+    val_loader = DataLoader(val_dataset, batch_size=params["batch_size"], shuffle=False, collate_fn=pad_collate)
+
+    torch.manual_seed(42)
+    device = torch.device("cpu")
+    model = TaikoModel(hidden_size=params["hidden_size"], num_layers=params["num_layers"], output_dim=LABEL_DIM)
+    criterion = torch.nn.MSELoss(reduction='none')
+    optimizer = torch.optim.Adam(model.parameters(), lr=params["lr"])
+
+    history[trial_id] = []
+    pruned = {"value": False}
+
+    def on_epoch_end(epoch, train_loss, val_loss):
+        # Manager proxies only see reassignment, not in-place appends
+        history[trial_id] = history[trial_id] + [val_loss]
+        if should_prune(dict(history), trial_id, epoch, val_loss, warmup_epochs, min_trials):
+            pruned["value"] = True
+            return True
+        return False
+
+    result = fit(model, train_loader, val_loader, criterion, optimizer, device,
+                 num_epochs=num_epochs, patience=patience,
+                 checkpoint_dir=os.path.join(sweep_dir, f"trial_{trial_id:03d}"),
+                 verbose=False, on_epoch_end=on_epoch_end)
+
+    return dict(params,
+                trial=trial_id,
+                status="pruned" if pruned["value"] else "completed",
+                best_val_loss=result["best_val_loss"],
+                epochs=result["epochs"],
+                seconds=round(time.perf_counter() - start, 2))
+
+def run_sweep(grid, cache_dir, sweep_dir="sweeps", workers=4, num_epochs=20, patience=5, warmup_epochs=3, min_trials=2):
+    os.makedirs(sweep_dir, exist_ok=True)
+    keys = list(grid.keys())
+    trials = [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    print(f"🔎 {len(trials)} trial(s) on {workers} worker(s) x {threads} thread(s)")
+
+    results_path = os.path.join(sweep_dir, "results.csv")
+    ctx = multiprocessing.get_context("spawn")
+    rows = []
+
+    with ctx.Manager() as manager, open(results_path, "w", newline="", encoding="utf-8") as f:
+        history = manager.dict()
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as executor:
+            futures = {
+                executor.submit(run_trial, i, params, cache_dir, sweep_dir, num_epochs, patience,
+                                threads, history, warmup_epochs, min_trials): i
+                for i, params in enumerate(trials)
+            }
+            for future in as_completed(futures):
+                try:
+                    row = future.result()
+                except Exception as e:
+                    row = dict(trials[futures[future]], trial=futures[future], status=f"failed: {e}")
+                    print(f"❌ Trial {futures[future]} failed: {e}")
+                else:
+                    icon = "✂️ " if row["status"] == "pruned" else "✅"
+                    print(f"{icon} Trial {row['trial']} {row['status']} after {row['epochs']} epoch(s): "
+                          f"val {row['best_val_loss']:.6f}")
+                # Written as each trial finishes so an interrupted sweep keeps its results
+                writer.writerow(row)
+                f.flush()
+                rows.append(row)
+
+    finished = [r for r in rows if "best_val_loss" in r]
+    if finished:
+        best = min(finished, key=lambda r: r["best_val_loss"])
+        print(f"\n🏆 Best trial {best['trial']}: " + ", ".join(f"{k}={best[k]}" for k in keys) +
+              f" (val {best['best_val_loss']:.6f})")
+    print(f"📁 Results written to {results_path}")
+    return rows
+
+def parse_list(value, cast):
+    return [cast(v) for v in value.split(",")]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel hyperparameter sweep over a shared feature cache")
+    parser.add_argument("--hidden-size", default="128,256")
+    parser.add_argument("--num-layers", default="1,2")
+    parser.add_argument("--lr", default="1e-3,3e-4")
+    parser.add_argument("--batch-size", default="4,8")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--patience", type=int, default=5)
+    parser.add_argument("--warmup-epochs", type=int, default=3, help="Never prune before this many epochs")
+    parser.add_argument("--min-trials", type=int, default=2, help="Trials needed at an epoch before pruning against them")
+    parser.add_argument("--cache-dir", default="feature_cache")
+    parser.add_argument("--rebuild-cache", action="store_true")
+    parser.add_argument("--sweep-dir", default="sweeps")
+    parser.add_argument("--audio-root", default=AUDIO_ROOT)
+    parser.add_argument("--label-root", default=LABEL_ROOT)
+    args = parser.parse_args()
+
+    if args.rebuild_cache or not os.path.exists(os.path.join(args.cache_dir, "index.pt")):
+        print(f"📦 Building feature cache in {args.cache_dir} ...")
+        build_feature_cache(TaikoDataset(audio_root=args.audio_root, label_root=args.label_root), args.cache_dir)
+
+    grid = {
+        "hidden_size": parse_list(args.hidden_size, int),
+        "num_layers": parse_list(args.num_layers, int),
+        "lr": parse_list(args.lr, float),
+        "batch_size": parse_list(args.batch_size, int),
+    }
+    run_sweep(grid, args.cache_dir, sweep_dir=args.sweep_dir, workers=args.workers,
+              num_epochs=args.epochs, patience=args.patience,
+              warmup_epochs=args.warmup_epochs, min_trials=args.min_trials)
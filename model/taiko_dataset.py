@@ -3,6 +3,11 @@ import torch
 from torch.utils.data import DataLoader, Dataset
 import torch.nn.functional as F
 
+# TaikoModel's CNN halves time twice, so one output step covers 4 mel frames
+LABEL_STRIDE = 4
+# Each step predicts a single value: the note symbol (0 = no note)
+LABEL_DIM = 1
+
 # Example dataset class (adjust paths and loading as needed)
 class TaikoDataset(Dataset):
     def __init__(self, audio_root, label_root):
@@ -40,12 +45,184 @@ class TaikoDataset(Dataset):
         label_path = self.label_files[idx]
 
         audio = torch.load(audio_path)  # Expected shape: [1, n_mels, time]
-        label = torch.load(label_path)  # Adjust according to your label tensor shape
+        label = torch.load(label_path)  # {"frames": int32 [notes], "types": uint8 [notes]}
+
+        return audio, label
+
+
+def build_feature_cache(dataset, cache_dir):
+    """
+    Packs every (audio, label) pair into flat binary files plus a small index,
+    written one song at a time. CachedTaikoDataset maps them read-only, so any
+    number of processes share one copy through the OS page cache.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    audio_shapes, audio_offsets = [], []
+    label_counts, label_offsets = [], []
+    audio_pos = 0
+    label_pos = 0
+
+    with open(os.path.join(cache_dir, "audio.bin"), "wb") as fa, \
+            open(os.path.join(cache_dir, "frames.bin"), "wb") as ff, \
+            open(os.path.join(cache_dir, "types.bin"), "wb") as ft:
+        for i in range(len(dataset)):
+            audio, label = dataset[i]
+            audio = audio.float().contiguous()
+
+            fa.write(audio.numpy().tobytes())
+            ff.write(label["frames"].to(torch.int32).numpy().tobytes())
+            ft.write(label["types"].to(torch.uint8).numpy().tobytes())
+
+            audio_shapes.append(list(audio.shape))
+            audio_offsets.append(audio_pos)
+            label_counts.append(len(label["frames"]))
+            label_offsets.append(label_pos)
+            audio_pos += audio.numel()
+            label_pos += len(label["frames"])
+
+    torch.save({
+        "audio_shapes": audio_shapes,
+        "audio_offsets": audio_offsets,
+        "audio_numel": audio_pos,
+        "label_counts": label_counts,
+        "label_offsets": label_offsets,
+        "label_numel": label_pos,
+    }, os.path.join(cache_dir, "index.pt"))
+
 
+class CachedTaikoDataset(Dataset):
+    """Read-only, memory-mapped view of a cache written by build_feature_cache."""
+
+    def __init__(self, cache_dir):
+        index = torch.load(os.path.join(cache_dir, "index.pt"))
+        self.audio_shapes = index["audio_shapes"]
+        self.audio_offsets = index["audio_offsets"]
+        self.label_counts = index["label_counts"]
+        self.label_offsets = index["label_offsets"]
+
+        # shared=False maps the files copy-on-write; nothing here ever writes
+        self.audio = torch.from_file(os.path.join(cache_dir, "audio.bin"), shared=False,
+                                     size=max(index["audio_numel"], 1), dtype=torch.float32)
+        self.frames = torch.from_file(os.path.join(cache_dir, "frames.bin"), shared=False,
+                                      size=max(index["label_numel"], 1), dtype=torch.int32)
+        self.types = torch.from_file(os.path.join(cache_dir, "types.bin"), shared=False,
+                                     size=max(index["label_numel"], 1), dtype=torch.uint8)
+
+    def __len__(self):
+        return len(self.audio_shapes)
+
+    def __getitem__(self, idx):
+        audio_shape = self.audio_shapes[idx]
+        audio_start = self.audio_offsets[idx]
+        audio_numel = 1
+        for dim in audio_shape:
+            audio_numel *= dim
+        audio = self.audio[audio_start:audio_start + audio_numel].view(audio_shape)
+
+        label_start = self.label_offsets[idx]
+        label_end = label_start + self.label_counts[idx]
+        label = {"frames": self.frames[label_start:label_end], "types": self.types[label_start:label_end]}
         return audio, label
 
 
-def pad_collate(batch):
+def crop_window(audio, label, start, length):
+    """Cuts frames [start, start + length) from a song, shifting its note events to match."""
+    audio = audio[..., start:start + length]
+    frames = label["frames"].long()
+    keep = (frames >= start) & (frames < start + audio.shape[-1])
+    return audio, {"frames": (frames[keep] - start).to(torch.int32), "types": label["types"][keep]}
+
+
+class WindowedTaikoDataset(Dataset):
+    """
+    Fixed-length training samples: windows_per_song random crops of
+    window_frames mel frames from each song, so batch memory no longer depends
+    on the longest track. Crops start on the model's step grid.
+    """
+
+    def __init__(self, dataset, window_frames=1024, windows_per_song=4, stride=LABEL_STRIDE):
+        self.dataset = dataset
+        self.window_frames = window_frames // stride * stride
+        self.windows_per_song = windows_per_song
+        self.stride = stride
+
+    def __len__(self):
+        return len(self.dataset) * self.windows_per_song
+
+    def __getitem__(self, idx):
+        audio, label = self.dataset[idx // self.windows_per_song]
+        max_start = max(0, audio.shape[-1] - self.window_frames) // self.stride
+        start = int(torch.randint(0, max_start + 1, (1,))) * self.stride
+        return crop_window(audio, label, start, self.window_frames)
+
+
+class WindowStream:
+    """
+    Batches for truncated BPTT. Slot b of consecutive batches walks through one
+    song window by window; when that song runs out the slot moves on to the
+    next song and its reset flag is set so the carried LSTM state is dropped.
+    Iterating yields (batch, reset), with batch exactly as pad_collate builds it.
+    """
+
+    def __init__(self, dataset, batch_size, window_frames=1024, shuffle=True, stride=LABEL_STRIDE):
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.window_frames = window_frames // stride * stride
+        self.shuffle = shuffle
+        self.stride = stride
+
+    def __iter__(self):
+        order = torch.randperm(len(self.dataset)).tolist() if self.shuffle else list(range(len(self.dataset)))
+        queue = iter(order)
+
+        def next_song():
+            idx = next(queue, None)
+            if idx is None:
+                return None
+            audio, label = self.dataset[idx]
+            return [audio, label, 0]
+
+        slots = [next_song() for _ in range(self.batch_size)]
+        reset = [True] * self.batch_size
+
+        while any(slot is not None for slot in slots):
+            template = next(slot[0] for slot in slots if slot is not None)
+            items = []
+            for slot in slots:
+                if slot is None:
+                    # Finished slot: zero-length window, masked out of the loss
+                    items.append((template[..., :0], {"frames": torch.zeros(0, dtype=torch.int32),
+                                                      "types": torch.zeros(0, dtype=torch.uint8)}))
+                else:
+                    items.append(crop_window(slot[0], slot[1], slot[2], self.window_frames))
+
+            yield pad_collate(items, self.stride), torch.tensor(reset)
+
+            reset = [False] * self.batch_size
+            for b, slot in enumerate(slots):
+                if slot is None:
+                    continue
+                slot[2] += self.window_frames
+                if slot[2] >= slot[0].shape[-1]:
+                    slots[b] = next_song()
+                    reset[b] = True
+
+
+def densify_labels(labels, num_steps, stride=LABEL_STRIDE):
+    """
+    Scatters sparse note events onto a [batch, num_steps, LABEL_DIM] grid with
+    one step per `stride` mel frames. Notes landing on the same step keep the
+    highest symbol; notes past the end of the grid are dropped.
+    """
+    dense = torch.zeros(len(labels), num_steps, dtype=torch.float32)
+    for b, label in enumerate(labels):
+        steps = label["frames"].long() // stride
+        keep = (steps >= 0) & (steps < num_steps)
+        dense[b].scatter_reduce_(0, steps[keep], label["types"][keep].float(), reduce="amax")
+    return dense.unsqueeze(-1)
+
+
+def pad_collate(batch, stride=LABEL_STRIDE):
     audios = [item[0] for item in batch]
     labels = [item[1] for item in batch]
 
@@ -62,23 +239,14 @@ def pad_collate(batch):
         padded_audios.append(padded)
     batch_audios = torch.stack(padded_audios)
 
-    # Pad labels on BOTH dimensions: sequence length (dim 0) AND features (dim 1)
-    max_label_seq_len = max(l.shape[0] for l in labels)
-    max_label_features = max(l.shape[1] for l in labels)
-    
-    padded_labels = []
-    for l in labels:
-        seq_pad_len = max_label_seq_len - l.shape[0]
-        feat_pad_len = max_label_features - l.shape[1]
-        
-        # F.pad format for 2D tensor: (pad_left, pad_right, pad_top, pad_bottom)
-        # We want to pad: right side of features (dim 1) and bottom of sequences (dim 0)
-        padded = F.pad(l, (0, feat_pad_len, 0, seq_pad_len))
-        padded_labels.append(padded)
-    
-    batch_labels = torch.stack(padded_labels)
-
-    return batch_audios, batch_labels
+    # Labels are only densified here, straight onto this batch's step grid
+    batch_labels = densify_labels(labels, max_audio_len // stride, stride)
+
+    # True lengths so the model can pack and the loss can skip padding
+    audio_lengths = torch.tensor([a.shape[-1] for a in audios], dtype=torch.long)
+    label_lengths = torch.div(audio_lengths, stride, rounding_mode='floor')
+
+    return batch_audios, batch_labels, audio_lengths, label_lengths
 
 
 if __name__ == "__main__":
@@ -92,7 +260,8 @@ if __name__ == "__main__":
     loader = DataLoader(dataset, batch_size=4, shuffle=True, collate_fn=pad_collate)
 
     # Iterate over the DataLoader
-    for audio_batch, label_batch in loader:
+    for audio_batch, label_batch, audio_lengths, label_lengths in loader:
         print("🎧 audio batch shape:", audio_batch.shape)
         print("🎯 label batch shape:", label_batch.shape)
+        print("📏 audio lengths:", audio_lengths.tolist())
         break
\ No newline at end of file
@@ -1,111 +1,83 @@
+import argparse
+import os
 import torch
-import torch.nn.functional as F
 from torch.utils.data import DataLoader, random_split
 from model import TaikoModel
-from taiko_dataset import TaikoDataset, pad_collate
-import os
-
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-print(f"Using device: {device}")
+from taiko_dataset import TaikoDataset, WindowedTaikoDataset, WindowStream, pad_collate, LABEL_DIM
 
 # Paths to your data
-audio_root = r"D:\taiko_ai\taiko-autochart\mel_features"
-label_root = r"D:\taiko_ai\taiko-autochart\dataset-labels-pt"
-
-# Dataset
-full_dataset = TaikoDataset(audio_root=audio_root, label_root=label_root)
-print(f"Total samples: {len(full_dataset)}")
-
-# Split ratios
-train_ratio = 0.7  # 70% for training
-val_ratio = 0.2    # 20% for validation
-test_ratio = 0.1   # 10% for testing
-
-# Calculate split sizes
-total_size = len(full_dataset)
-train_size = int(train_ratio * total_size)
-val_size = int(val_ratio * total_size)
-test_size = total_size - train_size - val_size  # Remainder goes to test
-
-print(f"Train size: {train_size}")
-print(f"Validation size: {val_size}")
-print(f"Test size: {test_size}")
-
-# Create random splits
-torch.manual_seed(42)  # For reproducible splits
-train_dataset, val_dataset, test_dataset = random_split(
-    full_dataset, 
-    [train_size, val_size, test_size]
-)
-
-# Create DataLoaders
-batch_size = 4
-train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True, collate_fn=pad_collate)
-val_loader = DataLoader(val_dataset, batch_size=batch_size, shuffle=False, collate_fn=pad_collate)
-test_loader = DataLoader(test_dataset, batch_size=batch_size, shuffle=False, collate_fn=pad_collate)
-
-# Check label dimensions for model setup
-print("Checking label dimensions...")
-sample_audio, sample_label = full_dataset[0]
-print(f"Sample label shape: {sample_label.shape}")
-
-# Find maximum feature dimension
-max_features = 0
-for i in range(min(20, len(full_dataset))):  # Check first 20 samples
-    _, label = full_dataset[i]
-    max_features = max(max_features, label.shape[1])
-print(f"Maximum features found: {max_features}")
-
-# Initialize model
-model = TaikoModel(output_dim=max_features)
-model.to(device)
-
-# Loss and optimizer
-criterion = torch.nn.MSELoss()
-optimizer = torch.optim.Adam(model.parameters(), lr=1e-3)
-
-# Training parameters
-num_epochs = 50
-best_val_loss = float('inf')
-patience = 10
-patience_counter = 0
-
-# Create directory for model checkpoints
-os.makedirs('checkpoints', exist_ok=True)
+AUDIO_ROOT = r"D:\taiko_ai\taiko-autochart\mel_features"
+LABEL_ROOT = r"D:\taiko_ai\taiko-autochart\dataset-labels-pt"
+
+def split_dataset(full_dataset, train_ratio=0.7, val_ratio=0.2, seed=42):
+    # Remainder goes to test
+    total_size = len(full_dataset)
+    train_size = int(train_ratio * total_size)
+    val_size = int(val_ratio * total_size)
+    test_size = total_size - train_size - val_size
+
+    # Seeded generator so every process gets the same split
+    generator = torch.Generator().manual_seed(seed)
+    return random_split(full_dataset, [train_size, val_size, test_size], generator=generator)
+
+def unwrap(model):
+    # DistributedDataParallel keeps the real model in .module
+    return getattr(model, 'module', model)
+
+def save_checkpoint(path, epoch, model, optimizer, train_loss, val_loss):
+    torch.save({
+        'epoch': epoch,
+        'model_state_dict': unwrap(model).state_dict(),
+        'optimizer_state_dict': optimizer.state_dict(),
+        'train_loss': train_loss,
+        'val_loss': val_loss,
+    }, path)
+
+def check_prediction_shape(preds, label_batch):
+    # pad_collate sizes the label grid to the CNN's output, so any difference is a bug
+    if preds.shape != label_batch.shape:
+        raise ValueError(f"predictions {tuple(preds.shape)} don't match labels {tuple(label_batch.shape)}")
+
+def masked_loss_sums(criterion, preds, label_batch, valid_lengths):
+    # criterion must use reduction='none'; only the first valid_lengths[b] steps count
+    steps = torch.arange(label_batch.size(1), device=label_batch.device)
+    mask = (steps.unsqueeze(0) < valid_lengths.unsqueeze(1)).unsqueeze(-1).float()
+    per_element = criterion(preds, label_batch) * mask
+    return per_element.sum(), mask.sum() * label_batch.size(2)
+
+def batch_loss_sums(model, batch, criterion, device, state=None):
+    """Summed masked loss, number of elements it covers, and the final LSTM state."""
+    audio_batch, label_batch, audio_lengths, label_lengths = batch
+    audio_batch = audio_batch.to(device)
+    label_batch = label_batch.float().to(device)
+
+    # Forward pass over packed, unpadded frames
+    preds, new_state = model(audio_batch, audio_lengths, state=state, return_state=True)
+    check_prediction_shape(preds, label_batch)
+
+    # A step is real only if both the labels and the downsampled audio reach it
+    valid_lengths = torch.minimum(label_lengths, unwrap(model).output_lengths(audio_lengths)).to(device)
+    total, count = masked_loss_sums(criterion, preds, label_batch, valid_lengths)
+    return total, count, new_state
+
+def compute_batch_loss(model, batch, criterion, device, state=None, return_state=False):
+    total, count, new_state = batch_loss_sums(model, batch, criterion, device, state=state)
+    loss = total / count.clamp(min=1)
+    if return_state:
+        return loss, new_state
+    return loss
 
 def train_epoch(model, loader, criterion, optimizer, device):
     model.train()
     total_loss = 0
     num_batches = 0
     
-    for audio_batch, label_batch in loader:
+    for batch in loader:
         optimizer.zero_grad()
         
-        audio_batch = audio_batch.to(device)
-        label_batch = label_batch.float().to(device)
-        
-        # Forward pass
-        preds = model(audio_batch)
-        
-        # Align dimensions
-        target_seq_len = label_batch.size(1)
-        if preds.size(1) != target_seq_len:
-            if preds.size(1) > target_seq_len:
-                preds = preds[:, :target_seq_len, :]
-            else:
-                pad_len = target_seq_len - preds.size(1)
-                preds = F.pad(preds, (0, 0, 0, pad_len))
-        
-        target_feat_len = label_batch.size(2)
-        if preds.size(2) != target_feat_len:
-            if preds.size(2) > target_feat_len:
-                preds = preds[:, :, :target_feat_len]
-            else:
-                pad_len = target_feat_len - preds.size(2)
-                preds = F.pad(preds, (0, pad_len))
+        loss = compute_batch_loss(model, batch, criterion, device)
         
         # Loss and backprop
-        loss = criterion(preds, label_batch)
         loss.backward()
         optimizer.step()
         
@@ -114,95 +86,195 @@ def train_epoch(model, loader, criterion, optimizer, device):
     
     return total_loss / num_batches
 
-def validate_epoch(model, loader, criterion, device):
-    model.eval()
+def train_epoch_tbptt(model, stream, criterion, optimizer, device):
+    """
+    train_epoch over a WindowStream: the forward LSTM state carries across
+    consecutive windows of a song, while gradients stop at each window edge.
+    """
+    model.train()
     total_loss = 0
     num_batches = 0
-    
-    with torch.no_grad():
-        for audio_batch, label_batch in loader:
-            audio_batch = audio_batch.to(device)
-            label_batch = label_batch.float().to(device)
-            
-            # Forward pass
-            preds = model(audio_batch)
-            
-            # Align dimensions (same as training)
-            target_seq_len = label_batch.size(1)
-            if preds.size(1) != target_seq_len:
-                if preds.size(1) > target_seq_len:
-                    preds = preds[:, :target_seq_len, :]
-                else:
-                    pad_len = target_seq_len - preds.size(1)
-                    preds = F.pad(preds, (0, 0, 0, pad_len))
-            
-            target_feat_len = label_batch.size(2)
-            if preds.size(2) != target_feat_len:
-                if preds.size(2) > target_feat_len:
-                    preds = preds[:, :, :target_feat_len]
-                else:
-                    pad_len = target_feat_len - preds.size(2)
-                    preds = F.pad(preds, (0, pad_len))
-            
-            loss = criterion(preds, label_batch)
-            total_loss += loss.item()
-            num_batches += 1
-    
+    state = None
+
+    for batch, reset in stream:
+        optimizer.zero_grad()
+
+        if state is not None:
+            state = unwrap(model).carry_state(state, reset.to(device))
+        loss, state = compute_batch_loss(model, batch, criterion, device, state=state, return_state=True)
+
+        loss.backward()
+        optimizer.step()
+
+        total_loss += loss.item()
+        num_batches += 1
+
     return total_loss / num_batches
 
-# Training loop with validation
-print("\nStarting training...")
-for epoch in range(num_epochs):
-    # Train
-    train_loss = train_epoch(model, train_loader, criterion, optimizer, device)
-    
-    # Validate
-    val_loss = validate_epoch(model, val_loader, criterion, device)
-    
-    print(f"Epoch {epoch+1}/{num_epochs}")
-    print(f"  Train Loss: {train_loss:.6f}")
-    print(f"  Val Loss: {val_loss:.6f}")
-    
-    # Early stopping and model saving
-    if val_loss < best_val_loss:
-        best_val_loss = val_loss
-        patience_counter = 0
-        # Save best model
-        torch.save({
-            'epoch': epoch,
-            'model_state_dict': model.state_dict(),
-            'optimizer_state_dict': optimizer.state_dict(),
-            'train_loss': train_loss,
-            'val_loss': val_loss,
-        }, 'checkpoints/best_model.pth')
-        print(f"  ✅ New best model saved! (Val Loss: {val_loss:.6f})")
-    else:
-        patience_counter += 1
-        if patience_counter >= patience:
-            print(f"\n⏹️  Early stopping triggered after {patience} epochs without improvement")
+def validation_sums(model, loader, criterion, device):
+    model.eval()
+    total_loss = 0.0
+    total_count = 0
+
+    with torch.no_grad():
+        for batch in loader:
+            total, count, _ = batch_loss_sums(model, batch, criterion, device)
+            total_loss += total.item()
+            total_count += int(count.item())
+
+    return total_loss, total_count
+
+def validate_epoch(model, loader, criterion, device):
+    # Mean over every valid element, so it doesn't depend on how songs are batched
+    total_loss, total_count = validation_sums(model, loader, criterion, device)
+    return total_loss / max(total_count, 1)
+
+def fit(model, train_loader, val_loader, criterion, optimizer, device, num_epochs=50, patience=10,
+        checkpoint_dir='checkpoints', is_main=True, verbose=True, reduce_loss=None, on_epoch_start=None, on_epoch_end=None,
+        train_fn=train_epoch, validate_fn=validate_epoch):
+    """
+    Training loop with validation, early stopping and checkpointing.
+
+    Only is_main writes checkpoints, and prints unless verbose is off. reduce_loss lets distributed
+    workers agree on one train loss, and validate_fn on one validation loss; on_epoch_end may
+    return True to stop early. train_fn is train_epoch, or train_epoch_tbptt for a WindowStream.
+    """
+    best_val_loss = float('inf')
+    patience_counter = 0
+    epochs_run = 0
+    log = is_main and verbose
+
+    if is_main:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+    for epoch in range(num_epochs):
+        if on_epoch_start is not None:
+            on_epoch_start(epoch)
+
+        # Train
+        train_loss = train_fn(model, train_loader, criterion, optimizer, device)
+
+        # Validate
+        val_loss = validate_fn(model, val_loader, criterion, device)
+
+        if reduce_loss is not None:
+            train_loss = reduce_loss(train_loss)
+        epochs_run = epoch + 1
+
+        if log:
+            print(f"Epoch {epoch+1}/{num_epochs}")
+            print(f"  Train Loss: {train_loss:.6f}")
+            print(f"  Val Loss: {val_loss:.6f}")
+
+        # Early stopping and model saving
+        if val_loss < best_val_loss:
+            best_val_loss = val_loss
+            patience_counter = 0
+            if is_main:
+                save_checkpoint(os.path.join(checkpoint_dir, 'best_model.pth'), epoch, model, optimizer, train_loss, val_loss)
+            if log:
+                print(f"  ✅ New best model saved! (Val Loss: {val_loss:.6f})")
+        else:
+            patience_counter += 1
+            if patience_counter >= patience:
+                if log:
+                    print(f"\n⏹️  Early stopping triggered after {patience} epochs without improvement")
+                break
+
+        # Save checkpoint every 10 epochs
+        if is_main and (epoch + 1) % 10 == 0:
+            save_checkpoint(os.path.join(checkpoint_dir, f'checkpoint_epoch_{epoch+1}.pth'), epoch, model, optimizer, train_loss, val_loss)
+            if log:
+                print(f"  💾 Checkpoint saved at epoch {epoch+1}")
+
+        if on_epoch_end is not None and on_epoch_end(epoch, train_loss, val_loss):
             break
-    
-    # Save checkpoint every 10 epochs
-    if (epoch + 1) % 10 == 0:
-        torch.save({
-            'epoch': epoch,
-            'model_state_dict': model.state_dict(),
-            'optimizer_state_dict': optimizer.state_dict(),
-            'train_loss': train_loss,
-            'val_loss': val_loss,
-        }, f'checkpoints/checkpoint_epoch_{epoch+1}.pth')
-        print(f"  💾 Checkpoint saved at epoch {epoch+1}")
-
-# Final evaluation on test set
-print("\n🧪 Evaluating on test set...")
-test_loss = validate_epoch(model, test_loader, criterion, device)
-print(f"Test Loss: {test_loss:.6f}")
-
-# Load best model for final save
-checkpoint = torch.load('checkpoints/best_model.pth')
-model.load_state_dict(checkpoint['model_state_dict'])
-torch.save(model.state_dict(), 'taiko_model_final.pth')
-print("\n✅ Training completed!")
-print(f"📊 Best validation loss: {best_val_loss:.6f}")
-print(f"📊 Final test loss: {test_loss:.6f}")
-print("📁 Final model saved as 'taiko_model_final.pth'")
\ No newline at end of file
+
+    return {'best_val_loss': best_val_loss, 'epochs': epochs_run}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train TaikoModel on mel features and note labels")
+    parser.add_argument("--epochs", type=int, default=50)
+    parser.add_argument("--patience", type=int, default=10)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--batch-size", type=int, default=None, help="Default: 4 for whole songs, 32 for windows")
+    parser.add_argument("--window-frames", type=int, default=None,
+                        help="Train on fixed windows of this many mel frames, e.g. 1024 (~24s)")
+    parser.add_argument("--carry-state", action="store_true",
+                        help="With --window-frames: truncated BPTT across consecutive windows of a song")
+    parser.add_argument("--audio-root", default=AUDIO_ROOT)
+    parser.add_argument("--label-root", default=LABEL_ROOT)
+    args = parser.parse_args(argv)
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    print(f"Using device: {device}")
+
+    # Dataset
+    full_dataset = TaikoDataset(audio_root=args.audio_root, label_root=args.label_root)
+    print(f"Total samples: {len(full_dataset)}")
+
+    # 70% train, 20% validation, 10% test, reproducible
+    train_dataset, val_dataset, test_dataset = split_dataset(full_dataset)
+
+    print(f"Train size: {len(train_dataset)}")
+    print(f"Validation size: {len(val_dataset)}")
+    print(f"Test size: {len(test_dataset)}")
+
+    # Windowed training: fixed-length windows keep per-step memory constant,
+    # so batches can be much larger. None trains on whole songs.
+    window_frames = args.window_frames
+    carry_state = args.carry_state
+
+    # Create DataLoaders
+    batch_size = args.batch_size or (4 if window_frames is None else 32)
+    train_fn = train_epoch
+    if window_frames is None:
+        train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True, collate_fn=pad_collate)
+    elif carry_state:
+        train_loader = WindowStream(train_dataset, batch_size, window_frames=window_frames)
+        train_fn = train_epoch_tbptt
+    else:
+        train_loader = DataLoader(WindowedTaikoDataset(train_dataset, window_frames=window_frames),
+                                  batch_size=batch_size, shuffle=True, collate_fn=pad_collate)
+    # Validation and test always score whole songs
+    eval_batch_size = 4
+    val_loader = DataLoader(val_dataset, batch_size=eval_batch_size, shuffle=False, collate_fn=pad_collate)
+    test_loader = DataLoader(test_dataset, batch_size=eval_batch_size, shuffle=False, collate_fn=pad_collate)
+
+    # Labels are sparse note events, densified per batch
+    sample_audio, sample_label = full_dataset[0]
+    print(f"Sample: {sample_audio.shape[-1]} frames, {len(sample_label['frames'])} notes")
+
+    # Initialize model
+    model = TaikoModel(output_dim=LABEL_DIM)
+    model.to(device)
+
+    # Loss and optimizer
+    criterion = torch.nn.MSELoss(reduction='none')  # masked to real frames in masked_loss_sums
+    optimizer = torch.optim.Adam(model.parameters(), lr=args.lr)
+
+    # Training loop with validation
+    print("\nStarting training...")
+    result = fit(model, train_loader, val_loader, criterion, optimizer, device, num_epochs=args.epochs, patience=args.patience,
+                 train_fn=train_fn)
+    best_val_loss = result['best_val_loss']
+
+    # Final evaluation on test set
+    print("\n🧪 Evaluating on test set...")
+    test_loss = validate_epoch(model, test_loader, criterion, device)
+    print(f"Test Loss: {test_loss:.6f}")
+
+    from evaluate import evaluate_loader, print_report
+    print_report(evaluate_loader(model, test_loader, device))
+
+    # Load best model for final save
+    checkpoint = torch.load('checkpoints/best_model.pth')
+    model.load_state_dict(checkpoint['model_state_dict'])
+    torch.save(model.state_dict(), 'taiko_model_final.pth')
+    print("\n✅ Training completed!")
+    print(f"📊 Best validation loss: {best_val_loss:.6f}")
+    print(f"📊 Final test loss: {test_loss:.6f}")
+    print("📁 Final model saved as 'taiko_model_final.pth'")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import argparse
+import os
+import socket
+import tempfile
+import time
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import DataLoader, Subset
+from torch.utils.data.distributed import DistributedSampler
+
+from model import TaikoModel
+from taiko_dataset import TaikoDataset, pad_collate, LABEL_DIM
+from train import AUDIO_ROOT, LABEL_ROOT, split_dataset, fit, validation_sums, unwrap
+
+def find_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def all_reduce_mean(value):
+    tensor = torch.tensor([value], dtype=torch.float64)
+    dist.all_reduce(tensor, op=dist.ReduceOp.SUM)
+    return tensor.item() / dist.get_world_size()
+
+def shard(dataset, rank, world_size):
+    # Every item exactly once across ranks; DistributedSampler would pad with repeats
+    return Subset(dataset, range(rank, len(dataset), world_size))
+
+def all_reduce_validate(model, loader, criterion, device):
+    # Summed loss over summed element counts: the same number at any worker count.
+    # Shards differ in size, so run the local replica; DDP's forward is a collective.
+    # The last training step updated each rank's BatchNorm stats from its own batch,
+    # so first copy rank 0's over: that's the model best_model.pth saves
+    local = unwrap(model)
+    for buffer in local.buffers():
+        dist.broadcast(buffer, 0)
+    total_loss, total_count = validation_sums(local, loader, criterion, device)
+    tensor = torch.tensor([total_loss, total_count], dtype=torch.float64)
+    dist.all_reduce(tensor, op=dist.ReduceOp.SUM)
+    return tensor[0].item() / max(tensor[1].item(), 1)
+
+def run_worker(rank, world_size, config, results=None):
+    # Split this machine's cores evenly so workers don't oversubscribe each other
+    local_workers = int(os.environ.get("LOCAL_WORLD_SIZE", world_size))
+    threads = config["threads_per_worker"] or max(1, (os.cpu_count() or 1) // local_workers)
+    torch.set_num_threads(threads)
+
+    dist.init_process_group("gloo", init_method="env://", rank=rank, world_size=world_size)
+    is_main = rank == 0
+    device = torch.device("cpu")
+
+    full_dataset = TaikoDataset(audio_root=config["audio_root"], label_root=config["label_root"])
+    if config["limit"]:
+        full_dataset = Subset(full_dataset, range(min(config["limit"], len(full_dataset))))
+
+    # Same seed on every rank, so every rank sees the same split
+    train_dataset, val_dataset, test_dataset = split_dataset(full_dataset)
+    if is_main:
+        print(f"🧩 {world_size} worker(s) x {threads} thread(s)")
+        print(f"Train size: {len(train_dataset)}")
+        print(f"Validation size: {len(val_dataset)}")
+        print(f"Test size: {len(test_dataset)}")
+
+    train_sampler = DistributedSampler(train_dataset, num_replicas=world_size, rank=rank, shuffle=True, seed=42)
+
+    batch_size = config["batch_size"]
+    train_loader = DataLoader(train_dataset, batch_size=batch_size, sampler=train_sampler, collate_fn=pad_collate)
+    val_loader = DataLoader(shard(val_dataset, rank, world_size), batch_size=batch_size, shuffle=False, collate_fn=pad_collate)
+    test_loader = DataLoader(shard(test_dataset, rank, world_size), batch_size=batch_size, shuffle=False, collate_fn=pad_collate)
+
+    # Identical initial weights everywhere; DDP also broadcasts rank 0's on wrap
+    torch.manual_seed(42)
+    model = TaikoModel(output_dim=LABEL_DIM)
+    # SyncBatchNorm has no CPU kernel, so on CPU each rank normalizes with its own batch
+    # statistics; all_reduce_validate syncs rank 0's running stats before scoring
+    if device.type != "cpu":
+        model = torch.nn.SyncBatchNorm.convert_sync_batchnorm(model)
+    model = DistributedDataParallel(model)  # gradients are all-reduced in backward
+
+    criterion = torch.nn.MSELoss(reduction='none')
+    optimizer = torch.optim.Adam(model.parameters(), lr=config["lr"])
+
+    epoch_times = []
+    epoch_start = {}
+
+    def on_epoch_start(epoch):
+        train_sampler.set_epoch(epoch)
+        epoch_start["t"] = time.perf_counter()
+
+    def on_epoch_end(epoch, train_loss, val_loss):
+        # Losses were already all-reduced, so every rank has finished this epoch
+        epoch_times.append(time.perf_counter() - epoch_start["t"])
+        if is_main:
+            samples = len(train_sampler) * world_size
+            print(f"  ⏱️  {epoch_times[-1]:.2f}s ({samples / epoch_times[-1]:.2f} samples/s)")
+        return False
+
+    result = fit(model, train_loader, val_loader, criterion, optimizer, device,
+                 num_epochs=config["epochs"], patience=config["patience"],
+                 checkpoint_dir=config["checkpoint_dir"], is_main=is_main,
+                 reduce_loss=all_reduce_mean, validate_fn=all_reduce_validate,
+                 on_epoch_start=on_epoch_start, on_epoch_end=on_epoch_end)
+
+    test_loss = all_reduce_validate(model, test_loader, criterion, device)
+
+    if is_main:
+        print(f"📊 Best validation loss: {result['best_val_loss']:.6f}")
+        print(f"📊 Test loss: {test_loss:.6f}")
+        if results is not None:
+            mean_epoch_time = sum(epoch_times) / len(epoch_times)
+            results.put({
+                "workers": world_size,
+                "epoch_time": mean_epoch_time,
+                "samples_per_sec": len(train_sampler) * world_size / mean_epoch_time,
+            })
+
+    dist.destroy_process_group()
+
+def launch(world_size, config):
+    # Single-machine launch; every worker rendezvouses on localhost
+    os.environ.setdefault("MASTER_ADDR", "127.0.0.1")
+    os.environ["MASTER_PORT"] = str(find_free_port())
+    results = mp.get_context("spawn").SimpleQueue()
+    mp.spawn(run_worker, args=(world_size, config, results), nprocs=world_size, join=True)
+    return results.get() if not results.empty() else None
+
+def report_scaling(worker_counts, config):
+    rows = []
+    for n in worker_counts:
+        print(f"\n🚀 Running with {n} worker(s)...")
+        stats = launch(n, config)
+        if stats:
+            rows.append(stats)
+
+    if not rows:
+        return rows
+
+    # Efficiency relative to the smallest worker count, scaled linearly
+    base = rows[0]
+    print("\n=== SCALING REPORT ===")
+    print(f"{'workers':>8} {'epoch s':>10} {'samples/s':>10} {'speedup':>8} {'efficiency':>10}")
+    for row in rows:
+        speedup = base["epoch_time"] / row["epoch_time"]
+        efficiency = speedup * base["workers"] / row["workers"]
+        print(f"{row['workers']:>8} {row['epoch_time']:>10.2f} {row['samples_per_sec']:>10.2f} {speedup:>8.2f} {efficiency:>10.1%}")
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Data-parallel CPU training with torch.distributed (gloo)")
+    parser.add_argument("--workers", type=int, default=4, help="Local worker processes")
+    parser.add_argument("--scaling", type=str, default=None, help="Comma-separated worker counts to benchmark, e.g. 1,2,4,8")
+    parser.add_argument("--epochs", type=int, default=50)
+    parser.add_argument("--patience", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=4, help="Per-worker batch size")
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--threads-per-worker", type=int, default=0, help="0 = split all cores evenly")
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N songs")
+    parser.add_argument("--audio-root", default=AUDIO_ROOT)
+    parser.add_argument("--label-root", default=LABEL_ROOT)
+    parser.add_argument("--checkpoint-dir", default="checkpoints")
+    args = parser.parse_args()
+
+    config = {
+        "audio_root": args.audio_root,
+        "label_root": args.label_root,
+        "epochs": args.epochs,
+        "patience": args.patience,
+        "batch_size": args.batch_size,
+        "lr": args.lr,
+        "threads_per_worker": args.threads_per_worker,
+        "limit": args.limit,
+        "checkpoint_dir": args.checkpoint_dir,
+    }
+
+    if "RANK" in os.environ and "WORLD_SIZE" in os.environ:
+        # Started by torchrun (single or multi-node); it already set MASTER_ADDR/PORT
+        run_worker(int(os.environ["RANK"]), int(os.environ["WORLD_SIZE"]), config)
+    elif args.scaling:
+        # Benchmark runs shouldn't overwrite real checkpoints
+        config["checkpoint_dir"] = tempfile.mkdtemp(prefix="taiko_scaling_")
+        report_scaling([int(n) for n in args.scaling.split(",")], config)
+    else:
+        launch(args.workers, config)
@@ -1,28 +1,145 @@
 import os
+import sys
+from pathlib import Path
+import numpy as np
+import soundfile as sf
 import torch
 import librosa
 import torchaudio.transforms as T
 
-def extract_mel_spectrogram(wav_path, sample_rate=22050, n_mels=128):
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from taiko_cli import load_script
+
+# The frame grid is defined once, next to the labels that index it
+_grid = load_script("parser/tja-parser.py")
+SAMPLE_RATE, N_FFT, HOP_LENGTH = _grid.SAMPLE_RATE, _grid.N_FFT, _grid.HOP_LENGTH
+
+def extract_mel_spectrogram(wav_path, sample_rate=SAMPLE_RATE, n_mels=128):
     waveform, sr = librosa.load(wav_path, sr=sample_rate, mono=True)
     waveform = torch.tensor(waveform).unsqueeze(0)
     mel_spectrogram = T.MelSpectrogram(
         sample_rate=sample_rate,
         n_mels=n_mels,
-        n_fft=2048,
-        hop_length=512
+        n_fft=N_FFT,
+        hop_length=HOP_LENGTH
     )
     mel = mel_spectrogram(waveform)
     return mel
 
-def process_dataset_wavs(dataset_dir, output_dir):
+def _iter_mono_blocks(wav_path, sample_rate, block_size):
+    # Same samples librosa.load(sr=sample_rate, mono=True) would return, one block at a time
+    with sf.SoundFile(wav_path) as f:
+        native_sr = f.samplerate
+        total_in = f.frames
+        resampler = None
+        if native_sr != sample_rate:
+            import soxr
+            # librosa's default res_type is soxr_hq
+            resampler = soxr.ResampleStream(native_sr, sample_rate, 1, dtype="float32", quality="HQ")
+            expected = int(np.ceil(total_in * sample_rate / native_sr))
+            produced = 0
+
+        for block in f.blocks(blocksize=block_size, dtype="float32", always_2d=True):
+            mono = block.mean(axis=1)
+            if resampler is None:
+                yield mono
+                continue
+            out = resampler.resample_chunk(mono, last=False)[:expected - produced]
+            produced += len(out)
+            yield out
+
+        if resampler is not None:
+            out = resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)[:expected - produced]
+            produced += len(out)
+            yield out
+            # librosa fixes the resampled length with trailing zeros
+            if produced < expected:
+                yield np.zeros(expected - produced, dtype=np.float32)
+
+def iter_mel_chunks(wav_path, sample_rate=SAMPLE_RATE, n_mels=128, chunk_frames=2048, block_size=65536):
+    """
+    Yields [1, n_mels, frames] mel chunks that concatenate to exactly what
+    extract_mel_spectrogram returns, while only ever holding about
+    chunk_frames * hop_length samples in memory.
+    """
+    n_fft = N_FFT
+    hop_length = HOP_LENGTH
+    pad = n_fft // 2
+
+    # center=False: the reflect padding torch.stft would add is rebuilt by hand at both edges
+    mel_spectrogram = T.MelSpectrogram(
+        sample_rate=sample_rate,
+        n_mels=n_mels,
+        n_fft=n_fft,
+        hop_length=hop_length,
+        center=False
+    )
+
+    def emit(buf, n_frames):
+        segment = torch.from_numpy(np.ascontiguousarray(buf[:(n_frames - 1) * hop_length + n_fft]))
+        return mel_spectrogram(segment.unsqueeze(0))
+
+    head = np.zeros(0, dtype=np.float32)
+    buf = None  # padded signal, starting at the next frame to compute
+
+    for samples in _iter_mono_blocks(wav_path, sample_rate, block_size):
+        if buf is None:
+            head = np.concatenate([head, samples])
+            if len(head) <= pad:
+                continue
+            # Left reflect padding needs the first pad + 1 samples
+            buf = np.concatenate([head[1:pad + 1][::-1], head])
+            head = None
+        else:
+            buf = np.concatenate([buf, samples])
+
+        while len(buf) >= (chunk_frames - 1) * hop_length + n_fft:
+            yield emit(buf, chunk_frames)
+            buf = buf[chunk_frames * hop_length:]
+
+    if buf is None:
+        # Too short to stream; let the one-shot path handle (or reject) it
+        waveform = torch.from_numpy(head).unsqueeze(0)
+        full = T.MelSpectrogram(sample_rate=sample_rate, n_mels=n_mels, n_fft=n_fft, hop_length=hop_length)
+        yield full(waveform)
+        return
+
+    buf = np.concatenate([buf, buf[-pad - 1:-1][::-1]])
+    while len(buf) >= n_fft:
+        n_frames = min(chunk_frames, (len(buf) - n_fft) // hop_length + 1)
+        yield emit(buf, n_frames)
+        buf = buf[n_frames * hop_length:]
+
+def extract_mel_spectrogram_chunked(wav_path, sample_rate=SAMPLE_RATE, n_mels=128, chunk_frames=2048):
+    # The frame count is known from the header, so chunks are written straight into place
+    info = sf.info(wav_path)
+    num_samples = info.frames
+    if info.samplerate != sample_rate:
+        num_samples = int(np.ceil(info.frames * sample_rate / info.samplerate))
+    num_frames = num_samples // HOP_LENGTH + 1
+
+    mel = torch.empty(1, n_mels, num_frames)
+    filled = 0
+    for chunk in iter_mel_chunks(wav_path, sample_rate=sample_rate, n_mels=n_mels, chunk_frames=chunk_frames):
+        if filled + chunk.size(-1) > num_frames:
+            raise ValueError(f"{wav_path}: header says {num_frames} mel frames, but the audio runs longer")
+        mel[..., filled:filled + chunk.size(-1)] = chunk
+        filled += chunk.size(-1)
+    if filled != num_frames:
+        raise ValueError(f"{wav_path}: header says {num_frames} mel frames, but the audio gave only {filled}")
+    return mel
+
+def process_dataset_wavs(dataset_dir, output_dir, chunked=False):
     os.makedirs(output_dir, exist_ok=True)
     for root, _, files in os.walk(dataset_dir):
         for file in files:
             if file.lower().endswith(".wav"):
                 wav_path = os.path.join(root, file)
                 print(f"Processing {wav_path} ...")
-                mel = extract_mel_spectrogram(wav_path)
+                if chunked:
+                    mel = extract_mel_spectrogram_chunked(wav_path)
+                else:
+                    mel = extract_mel_spectrogram(wav_path)
                 
                 # Match label structure
                 rel_path = os.path.relpath(wav_path, dataset_dir)
@@ -38,4 +155,4 @@ def process_dataset_wavs(dataset_dir, output_dir):
 if __name__ == "__main__":
     dataset_dir = "dataset-semi"
     output_dir = "mel_features"
-    process_dataset_wavs(dataset_dir, output_dir)
+    process_dataset_wavs(dataset_dir, output_dir, chunked=True)
@@ -0,0 +1,200 @@
+import argparse
+import os
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from taiko_cli import load_script
+
+SONG_HEADERS = {"TITLE": "title", "SUBTITLE": "subtitle", "BPM": "bpm", "OFFSET": "offset", "WAVE": "wave", "GENRE": "genre"}
+NOTE_SYMBOLS = set("1234")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS songs (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime REAL NOT NULL,
+    encoding TEXT,
+    title TEXT,
+    subtitle TEXT,
+    bpm REAL,
+    offset REAL,
+    wave TEXT,
+    genre TEXT
+);
+CREATE TABLE IF NOT EXISTS courses (
+    song_id INTEGER NOT NULL REFERENCES songs(id) ON DELETE CASCADE,
+    course TEXT NOT NULL,
+    level INTEGER,
+    notes INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_songs_bpm ON songs(bpm);
+CREATE INDEX IF NOT EXISTS idx_courses_course_level ON courses(course, level);
+CREATE INDEX IF NOT EXISTS idx_courses_song ON courses(song_id);
+"""
+
+# Standard library only at import time, so loading it in every worker is cheap
+tja_parser = load_script("parser/tja-parser.py")
+
+def to_number(value, cast=float):
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return None
+
+def parse_tja_metadata(text):
+    """
+    Song headers plus one entry per #START/#END block: course, level and note
+    count. COURSE/LEVEL carry over to later blocks (e.g. the P1/P2 halves of a
+    STYLE:Double chart), and branched sections count tja_parser.CHART_BRANCH only.
+    """
+    song = {}
+    courses = []
+    pending = {}
+    current = None
+    counting = True
+
+    for line in text.splitlines():
+        line = line.split('//')[0].strip()
+        if not line:
+            continue
+
+        if current is not None:
+            command = line.split()[0]
+            if command == '#END':
+                courses.append(current)
+                current = None
+            elif command in tja_parser.BRANCHES:
+                counting = command == tja_parser.CHART_BRANCH
+            elif command in ('#BRANCHSTART', '#BRANCHEND'):
+                counting = True
+            elif counting and not line.startswith('#'):
+                current["notes"] += sum(1 for c in line if c in NOTE_SYMBOLS)
+            continue
+
+        if line.startswith('#START'):
+            current = {"course": pending.get("course", "Oni"), "level": pending.get("level"), "notes": 0}
+            counting = True
+            continue
+
+        if ':' not in line:
+            continue
+        key, value = line.split(':', 1)
+        key, value = key.strip().upper(), value.strip()
+
+        if key == 'COURSE':
+            # Same names parse_tja_events uses, so catalog queries select charts it labels
+            pending["course"] = tja_parser.normalize_course(value) or value
+        elif key == 'LEVEL':
+            pending["level"] = to_number(value, int)
+        elif key in SONG_HEADERS and SONG_HEADERS[key] not in song:
+            song[SONG_HEADERS[key]] = to_number(value) if key in ('BPM', 'OFFSET') else value
+
+    return song, courses
+
+def index_one(args):
+    path, mtime = args
+    try:
+        text, encoding = tja_parser.read_tja_text(path)
+        song, courses = parse_tja_metadata(text)
+        return path, mtime, encoding, song, courses, None
+    except Exception as e:
+        return path, mtime, None, None, None, str(e)
+
+def open_catalog(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+def find_tja_files(dataset_dir):
+    tja_files = []
+    for root, _, files in os.walk(dataset_dir):
+        for file in files:
+            if file.lower().endswith(".tja"):
+                tja_files.append(os.path.abspath(os.path.join(root, file)))
+    return tja_files
+
+def build_catalog(dataset_dir, db_path="tja_catalog.sqlite", max_workers=None):
+    conn = open_catalog(db_path)
+    known = dict(conn.execute("SELECT path, mtime FROM songs"))
+
+    on_disk = {path: os.path.getmtime(path) for path in find_tja_files(dataset_dir)}
+    # Only new or modified files get parsed again
+    todo = [(path, mtime) for path, mtime in on_disk.items() if known.get(path) != mtime]
+    root = os.path.abspath(dataset_dir)
+    removed = [p for p in known if p.startswith(root + os.sep) and p not in on_disk]
+
+    print(f"Found {len(on_disk)} .tja files ({len(todo)} new or changed, {len(removed)} removed)")
+
+    indexed = failed = 0
+    with conn:
+        conn.executemany("DELETE FROM songs WHERE path = ?", [(p,) for p in removed])
+
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for path, mtime, encoding, song, courses, error in executor.map(index_one, todo, chunksize=32):
+                if error:
+                    print(f"❌ Error indexing {path}: {error}")
+                    failed += 1
+                    continue
+
+                conn.execute("DELETE FROM songs WHERE path = ?", (path,))
+                cur = conn.execute(
+                    "INSERT INTO songs (path, mtime, encoding, title, subtitle, bpm, offset, wave, genre) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (path, mtime, encoding, song.get("title"), song.get("subtitle"), song.get("bpm"),
+                     song.get("offset"), song.get("wave"), song.get("genre")))
+                conn.executemany(
+                    "INSERT INTO courses (song_id, course, level, notes) VALUES (?, ?, ?, ?)",
+                    [(cur.lastrowid, c["course"], c["level"], c["notes"]) for c in courses])
+                indexed += 1
+
+    print(f"\n✅ Indexed: {indexed}")
+    print(f"🔁 Unchanged: {len(on_disk) - len(todo)}")
+    print(f"❌ Failed: {failed}")
+    conn.close()
+
+def query_catalog(db_path, course=None, min_level=None, max_level=None, min_bpm=None, max_bpm=None):
+    """Returns (path, title, bpm, course, level) rows matching every filter given."""
+    clauses, params = [], []
+    for sql, value in (("c.course = ?", course), ("c.level >= ?", min_level), ("c.level <= ?", max_level),
+                       ("s.bpm >= ?", min_bpm), ("s.bpm <= ?", max_bpm)):
+        if value is not None:
+            clauses.append(sql)
+            params.append(value)
+
+    sql = ("SELECT s.path, s.title, s.bpm, c.course, c.level FROM songs s JOIN courses c ON c.song_id = s.id"
+           + (" WHERE " + " AND ".join(clauses) if clauses else "") + " ORDER BY s.path")
+    conn = open_catalog(db_path)
+    rows = conn.execute(sql, params).fetchall()
+    conn.close()
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index .tja files into a queryable SQLite catalog")
+    parser.add_argument("--db", default="tja_catalog.sqlite")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_index = sub.add_parser("index", help="Parse new/changed .tja files into the catalog")
+    p_index.add_argument("dataset_dir", nargs="?", default="dataset-semi")
+    p_index.add_argument("--workers", type=int, default=None)
+
+    p_query = sub.add_parser("query", help="List charts matching the filters")
+    p_query.add_argument("--course")
+    p_query.add_argument("--min-level", type=int)
+    p_query.add_argument("--max-level", type=int)
+    p_query.add_argument("--min-bpm", type=float)
+    p_query.add_argument("--max-bpm", type=float)
+    p_query.add_argument("--paths-only", action="store_true", help="Print one .tja path per line")
+
+    args = parser.parse_args()
+    if args.command == "index":
+        build_catalog(args.dataset_dir, args.db, max_workers=args.workers)
+    else:
+        rows = query_catalog(args.db, args.course, args.min_level, args.max_level, args.min_bpm, args.max_bpm)
+        for path, title, bpm, course, level in rows:
+            print(path if args.paths_only else f"{course:<6} ★{level}  {bpm if bpm is not None else '?':>6} BPM  {title}  ({path})")
+        if not args.paths_only:
+            print(f"\n📦 {len(rows)} chart(s)")
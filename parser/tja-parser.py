@@ -1,67 +1,178 @@
 import os
 import re
-import torch
 from pathlib import Path
 
-VALID_NOTES = {'0', '1', '2', '3', '4', '5', '6', '7', '8', '9'}  # all supported symbols
-SUPPORTED_COURSES = {"Easy", "Normal", "Hard", "Oni", "Ura", "Edit"}
+# Mel frame grid the labels index, shared with audio-parser.py and generate.py.
+# Kept here because this file imports nothing outside the standard library
+SAMPLE_RATE = 22050
+N_FFT = 2048
+HOP_LENGTH = 512
 
-def parse_tja_file(tja_path):
+VALID_NOTES = {'0', '1', '2', '3', '4', '5', '6', '7', '8', '9'}  # all supported symbols
+SUPPORTED_COURSES = {"Easy", "Normal", "Hard", "Oni", "Edit"}
+# Numeric COURSE values map onto the named ones; Ura is the same course as Edit
+COURSE_NAMES = {"0": "Easy", "1": "Normal", "2": "Hard", "3": "Oni", "4": "Edit", "Ura": "Edit"}
+BRANCHES = ('#N', '#E', '#M')  # normal, expert and master versions of the same measures
+CHART_BRANCH = '#M'  # the only branch kept from branched sections
+
+def read_tja_text(tja_path):
+    """
+    Decodes a .tja file, returning (text, encoding). TJA files are mostly
+    UTF-8 or Shift-JIS, so try those strictly before falling back.
+    """
+    with open(tja_path, "rb") as f:
+        raw = f.read()
+
+    if raw.startswith(b"\xef\xbb\xbf"):
+        return raw[3:].decode("utf-8", errors="replace"), "utf-8-sig"
+
+    for encoding in ("utf-8", "cp932"):
+        try:
+            return raw.decode(encoding), encoding
+        except UnicodeDecodeError:
+            pass
+
+    try:
+        import chardet
+        guess = chardet.detect(raw).get("encoding")
+        if guess:
+            return raw.decode(guess, errors="replace"), guess.lower()
+    except (ImportError, LookupError):
+        pass
+
+    return raw.decode("cp932", errors="replace"), "cp932"
+
+def normalize_course(value):
+    """Canonical name for a COURSE: value (any case, or 0-4), or None if it isn't a known course."""
+    name = value.strip().capitalize()
+    name = COURSE_NAMES.get(name, name)
+    return name if name in SUPPORTED_COURSES else None
+
+def _to_float(value, default):
+    try:
+        return float(value)
+    except ValueError:
+        return default
+
+def _flush_measure(items, t, bpm, beats, events):
+    # Every note symbol gets an equal share of the measure's beats, at the BPM in force when it is reached
+    slots = sum(1 for item in items if not item.startswith('#'))
+    for item in items:
+        if item.startswith('#'):
+            name, _, arg = item.partition(' ')
+            if name == '#BPMCHANGE':
+                bpm = _to_float(arg, bpm)
+            elif name == '#MEASURE' and '/' in arg:
+                num, den = arg.split('/', 1)
+                beats = 4 * _to_float(num, 4) / _to_float(den, 4)
+            elif name == '#DELAY':
+                t += _to_float(arg, 0.0)
+            continue
+
+        if item != '0':
+            events.append((t, int(item)))
+        t += beats / slots * 60.0 / bpm
+
+    # Empty measures still take up time
+    if slots == 0:
+        t += beats * 60.0 / bpm
+    return t, bpm, beats
+
+def parse_tja_events(tja_path):
+    """
+    Note onsets per course as (course, [(seconds, note type), ...]), following
+    BPM, OFFSET, #BPMCHANGE, #MEASURE and #DELAY. A measure may span several
+    lines, and empty measures keep their length.
+    Branched sections keep CHART_BRANCH only; every branch starts from the
+    #BRANCHSTART position, and the chart continues from where CHART_BRANCH ends.
+    """
     charts = []
-    current_course = None
+    bpm = 120.0
+    offset = 0.0
+    current_course = "Oni"  # the course a chart without COURSE: is played as
     collecting = False
-    current_chart = []
-
-    with open(tja_path, encoding='utf-8', errors='ignore') as f:
-        for line in f:
-            line = line.strip()
-
-            # Skip comments and empty lines
-            if not line or line.startswith('//'):
-                continue
 
-            # Detect course header
-            if line.startswith('COURSE:'):
-                course_name = line.split(':')[1].strip()
-                if course_name not in SUPPORTED_COURSES:
-                    current_course = None
-                else:
-                    current_course = course_name
-                continue
-
-            if '#START' in line and current_course:
+    text, _ = read_tja_text(tja_path)
+    for line in text.splitlines():
+        line = line.split('//')[0].strip()
+        if not line:
+            continue
+
+        if not collecting:
+            if line.startswith('BPM:'):
+                bpm = _to_float(line[4:].strip(), bpm)
+            elif line.startswith('OFFSET:'):
+                offset = _to_float(line[7:].strip(), offset)
+            elif line.startswith('COURSE:'):
+                current_course = normalize_course(line.split(':', 1)[1])
+            elif line.startswith('#START') and current_course:
                 collecting = True
-                current_chart = []
-                continue
-
-            if '#END' in line and collecting:
-                collecting = False
-                if current_chart:
-                    charts.append((current_course, current_chart))
-                current_chart = []
-                continue
-
-            # Handle chart lines (e.g. 10101010,)
-            if collecting:
-                line = line.split('//')[0]  # remove inline comments
-                for section in line.split(','):
-                    section = section.strip()
-                    if section and all(c in VALID_NOTES for c in section):
-                        current_chart.append([int(c) for c in section])
+                # The first measure starts OFFSET seconds before the audio does
+                t, chart_bpm, beats = -offset, bpm, 4.0
+                items, events = [], []
+                branch_start = branch_end = None
+                keep = True
+            continue
+
+        if line.startswith('#END'):
+            collecting = False
+            if events:
+                charts.append((current_course, events))
+            continue
+
+        if line.startswith('#'):
+            command = line.split()[0]
+            if command in BRANCHES:
+                position = (t, chart_bpm, beats, list(items))
+                if branch_start is None:
+                    branch_start = position
+                else:
+                    if keep:
+                        branch_end = position
+                    t, chart_bpm, beats, items = branch_start
+                    items = list(items)
+                keep = command == CHART_BRANCH
+            elif command in ('#BRANCHSTART', '#BRANCHEND'):
+                # Also closes a previous section that had no #BRANCHEND
+                if not keep and branch_end is not None:
+                    t, chart_bpm, beats, items = branch_end
+                branch_start = branch_end = None
+                keep = True
+            else:
+                items.append(line)
+            continue
+
+        for c in line:
+            if c == ',':
+                t, chart_bpm, beats = _flush_measure(items, t, chart_bpm, beats, events if keep else [])
+                items = []
+            elif c in VALID_NOTES:
+                items.append(c)
 
     return charts
 
-def save_label_tensor(chart_lines, output_path):
-    # Pad lines to max length for consistent tensor shape
-    if not chart_lines:
+def save_label_events(events, output_path):
+    """
+    Saves notes as two parallel arrays: mel frame index (int32) and note type
+    (uint8). Densified to the training grid only when batches are built.
+    """
+    # Imported here so catalog indexing workers never pay for torch
+    import torch
+
+    frames, types = [], []
+    for t, note in events:
+        frame = round(t * SAMPLE_RATE / HOP_LENGTH)
+        if frame >= 0:
+            frames.append(frame)
+            types.append(note)
+    if not frames:
         return False
 
-    max_len = max(len(line) for line in chart_lines)
-    padded = [line + [0] * (max_len - len(line)) for line in chart_lines]
-    tensor = torch.tensor(padded, dtype=torch.long)
-
     os.makedirs(output_path.parent, exist_ok=True)
-    torch.save(tensor, output_path)
+    torch.save({
+        "frames": torch.tensor(frames, dtype=torch.int32),
+        "types": torch.tensor(types, dtype=torch.uint8),
+    }, output_path)
     return True
 
 def process_dataset_tja(dataset_dir, output_root):
@@ -75,16 +186,16 @@ def process_dataset_tja(dataset_dir, output_root):
 
                 print(f"Parsing: {tja_path}")
                 try:
-                    charts = parse_tja_file(tja_path)
+                    charts = parse_tja_events(tja_path)
                     if not charts:
                         print(f"⚠️  Skipping {tja_path} (no chart lines found)")
                         continue
 
                     # Save only the first course (you can change this logic)
-                    course_name, chart_lines = charts[0]
-                    success = save_label_tensor(chart_lines, output_path)
+                    course_name, events = charts[0]
+                    success = save_label_events(events, output_path)
                     if success:
-                        print(f"✅ Saved labels tensor: {output_path}")
+                        print(f"✅ Saved label events: {output_path}")
                     else:
                         print(f"⚠️  Skipped (empty chart): {tja_path}")
 
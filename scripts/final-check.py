@@ -1,8 +1,16 @@
 import os
+import sys
+from pathlib import Path
 from pydub import AudioSegment
 from fuzzywuzzy import fuzz
 from fuzzywuzzy import process
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from taiko_cli import load_script
+
+# Shared .tja decoding: UTF-8, Shift-JIS and friends
+tja_parser = load_script("parser/tja-parser.py")
+
 def find_files_with_ext(root_dir, ext):
     result = []
     for root, _, files in os.walk(root_dir):
@@ -48,19 +56,19 @@ def parse_tja_for_audio_references(tja_path):
     # Parse lines that start with "WAVE:" or #NEXTSONG line that may contain audio filename
     audio_files = set()
     try:
-        with open(tja_path, encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if line.startswith("WAVE:"):
-                    wave_file = line[5:].strip()
-                    if wave_file:
+        text, _ = tja_parser.read_tja_text(tja_path)
+        for line in text.splitlines():
+            line = line.strip()
+            if line.startswith("WAVE:"):
+                wave_file = line[5:].strip()
+                if wave_file:
+                    audio_files.add(wave_file)
+            elif line.startswith("#NEXTSONG"):
+                parts = line.split(",")
+                if len(parts) >= 4:
+                    wave_file = parts[3].strip()
+                    if wave_file.lower().endswith(('.ogg', '.wav')):
                         audio_files.add(wave_file)
-                elif line.startswith("#NEXTSONG"):
-                    parts = line.split(",")
-                    if len(parts) >= 4:
-                        wave_file = parts[3].strip()
-                        if wave_file.lower().endswith(('.ogg', '.wav')):
-                            audio_files.add(wave_file)
     except Exception as e:
         print(f"Error reading {tja_path}: {e}")
     return audio_files
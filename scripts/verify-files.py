@@ -2,21 +2,29 @@ import os
 import re
 import shutil
 import subprocess
+import sys
 import difflib
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from taiko_cli import load_script
+
+# Shared .tja decoding, so Shift-JIS WAVE names survive
+tja_parser = load_script("parser/tja-parser.py")
 
 FFMPEG_PATH = r"D:\taiko_ai\taiko-autochart\tools\ffmpeg\bin\ffmpeg.exe"  # Set your FFmpeg path
 SAMPLE_RATE = 22050
 
 def extract_ogg_names_from_tja(tja_path):
     ogg_files = set()
-    with open(tja_path, "r", encoding="utf-8", errors="ignore") as f:
-        for line in f:
-            wave_match = re.search(r'WAVE\s*:\s*(.+\.ogg)', line, re.IGNORECASE)
-            if wave_match:
-                ogg_files.add(wave_match.group(1).strip())
-            nextsong_match = re.search(r'#NEXTSONG[^,]*,[^,]*,[^,]*,\s*(.+\.ogg)', line, re.IGNORECASE)
-            if nextsong_match:
-                ogg_files.add(nextsong_match.group(1).strip())
+    text, _ = tja_parser.read_tja_text(tja_path)
+    for line in text.splitlines():
+        wave_match = re.search(r'WAVE\s*:\s*(.+\.ogg)', line, re.IGNORECASE)
+        if wave_match:
+            ogg_files.add(wave_match.group(1).strip())
+        nextsong_match = re.search(r'#NEXTSONG[^,]*,[^,]*,[^,]*,\s*(.+\.ogg)', line, re.IGNORECASE)
+        if nextsong_match:
+            ogg_files.add(nextsong_match.group(1).strip())
     return ogg_files
 
 def fuzzy_match_file(filename, file_list, cutoff=0.6):
@@ -0,0 +1,137 @@
+"""
+Single entry point for the pipeline tools: `taiko <command> ...`.
+
+Only the standard library is imported up front. Each subcommand loads its
+tool script when it runs, so `taiko convert` or `taiko --help` never pay for
+torch/librosa/torchaudio. Tools with their own argument parser run as a
+child interpreter; that keeps their process pools working on every platform.
+"""
+import argparse
+import importlib.util
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+TOOL_DIRS = ("model", "parser", "scripts")
+
+def load_script(relative_path):
+    """Loads a tool script by its path from the repository root; most have hyphenated names."""
+    path = os.path.join(ROOT, relative_path)
+    name = os.path.splitext(os.path.basename(path))[0].replace("-", "_")
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def run_script(relative_path, argv):
+    return subprocess.call([sys.executable, os.path.join(ROOT, relative_path)] + list(argv))
+
+def cmd_convert(args):
+    if args.missing_log:
+        tool = load_script("scripts/convert_missing_oggs.py")
+    else:
+        tool = load_script("scripts/ogg-to-wav.py")
+    if args.ffmpeg:
+        tool.FFMPEG_PATH = args.ffmpeg
+
+    if args.missing_log:
+        tool.SAMPLE_RATE = args.sample_rate
+        tool.process_missing_file_list(args.missing_log)
+    else:
+        tool.convert_ogg_to_wav_parallel(args.src_dir, sample_rate=args.sample_rate,
+                                         max_workers=args.workers, limit=args.limit)
+    return 0
+
+def cmd_verify(args):
+    if args.report:
+        # Read-only report; needs pydub and fuzzywuzzy
+        load_script("scripts/final-check.py").main(args.src_dir)
+        return 0
+
+    tool = load_script("scripts/verify-files.py")
+    if args.ffmpeg:
+        tool.FFMPEG_PATH = args.ffmpeg
+    tool.build_dataset_with_fuzzy_fix(args.src_dir, args.dst_dir, limit=args.limit)
+    return 0
+
+def cmd_extract(args):
+    load_script("parser/audio-parser.py").process_dataset_wavs(args.dataset_dir, args.output_dir,
+                                                               chunked=not args.one_shot)
+    return 0
+
+def cmd_parse(args):
+    load_script("parser/tja-parser.py").process_dataset_tja(args.dataset_dir, args.output_dir)
+    return 0
+
+# Tools that already have a full command line of their own
+PASSTHROUGH = {
+    "catalog": ("parser/tja-index.py", "Index .tja metadata into SQLite, or query it"),
+    "train": ("model/train.py", "Train TaikoModel"),
+    "train-dist": ("model/train_distributed.py", "Data-parallel CPU training (gloo)"),
+    "sweep": ("model/sweep.py", "Parallel hyperparameter sweep"),
+    "evaluate": ("model/evaluate.py", "Onset precision/recall/F1 on the test split"),
+    "infer": ("model/generate.py", "Generate .tja charts for a directory of audio"),
+}
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="taiko", description="Taiko auto-chart pipeline tools")
+    sub = parser.add_subparsers(dest="command", metavar="<command>")
+    sub.required = True
+
+    p = sub.add_parser("convert", help="Convert .ogg files to mono .wav with ffmpeg")
+    p.add_argument("src_dir", nargs="?", default="dataset-dirty")
+    p.add_argument("--missing-log", help="Only convert the .ogg paths listed in this file")
+    p.add_argument("--ffmpeg", help="Path to the ffmpeg binary")
+    p.add_argument("--sample-rate", type=int, default=22050)
+    p.add_argument("--workers", type=int, default=6)
+    p.add_argument("--limit", type=int, default=None)
+    p.set_defaults(func=cmd_convert)
+
+    p = sub.add_parser("verify", help="Copy song folders whose audio is all present into a clean dataset")
+    p.add_argument("src_dir", nargs="?", default="dataset-dirty")
+    p.add_argument("dst_dir", nargs="?", default="dataset-semi")
+    p.add_argument("--report", action="store_true", help="Only report missing/corrupt files under src_dir")
+    p.add_argument("--ffmpeg", help="Path to the ffmpeg binary")
+    p.add_argument("--limit", type=int, default=None)
+    p.set_defaults(func=cmd_verify)
+
+    p = sub.add_parser("extract", help="Extract mel spectrograms from .wav files")
+    p.add_argument("dataset_dir", nargs="?", default="dataset-semi")
+    p.add_argument("output_dir", nargs="?", default="mel_features")
+    p.add_argument("--one-shot", action="store_true", help="Load whole files instead of streaming them")
+    p.set_defaults(func=cmd_extract)
+
+    p = sub.add_parser("parse", help="Turn .tja charts into note event labels")
+    p.add_argument("dataset_dir", nargs="?", default="dataset-semi")
+    p.add_argument("output_dir", nargs="?", default="dataset-labels-pt")
+    p.set_defaults(func=cmd_parse)
+
+    for name, (path, help_text) in PASSTHROUGH.items():
+        # add_help=False so `taiko train --help` shows the tool's own options
+        p = sub.add_parser(name, help=help_text, add_help=False)
+        p.set_defaults(script=path)
+
+    return parser
+
+def check_checkout():
+    # A regular (non-editable) install copies only this file, away from the tools it runs
+    missing = [d for d in TOOL_DIRS if not os.path.isdir(os.path.join(ROOT, d))]
+    if missing:
+        sys.exit(f"taiko: no {', '.join(d + '/' for d in missing)} next to {os.path.abspath(__file__)}\n"
+                 "The tools run from a source checkout; install it with `pip install -e .` from the repository root.")
+
+def main(argv=None):
+    check_checkout()
+    argv = sys.argv[1:] if argv is None else argv
+    parser = build_parser()
+    args, rest = parser.parse_known_args(argv)
+
+    if hasattr(args, "script"):
+        return run_script(args.script, rest)
+    if rest:
+        parser.error(f"unrecognized arguments: {' '.join(rest)}")
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
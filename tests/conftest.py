@@ -0,0 +1,9 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The model scripts import each other as siblings; taiko_cli lives at the top
+for path in (ROOT, os.path.join(ROOT, "model")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+sf = pytest.importorskip("soundfile")
+torch = pytest.importorskip("torch")
+pytest.importorskip("librosa")
+pytest.importorskip("torchaudio")
+
+from taiko_cli import load_script
+
+audio_parser = load_script("parser/audio-parser.py")
+
+@pytest.fixture
+def write_wav(tmp_path):
+    def write(num_samples, sample_rate=22050, channels=1):
+        rng = np.random.default_rng(num_samples)
+        path = tmp_path / f"tone_{num_samples}_{sample_rate}_{channels}.wav"
+        sf.write(str(path), rng.uniform(-0.5, 0.5, (num_samples, channels)).astype(np.float32), sample_rate,
+                 subtype="FLOAT")
+        return str(path)
+    return write
+
+@pytest.mark.parametrize("num_samples", [
+    1500,          # shorter than one chunk: only the end-of-file path runs
+    512 * 40,      # ends exactly on a hop
+    512 * 37 + 301,
+])
+def test_chunks_match_one_shot(write_wav, num_samples):
+    path = write_wav(num_samples)
+    expected = audio_parser.extract_mel_spectrogram(path)
+
+    # Tiny blocks and chunks: many streamed chunks plus both reflect-padded edges
+    chunks = list(audio_parser.iter_mel_chunks(path, chunk_frames=8, block_size=700))
+    streamed = torch.cat(chunks, dim=-1)
+
+    assert streamed.shape == expected.shape
+    assert torch.allclose(streamed, expected, rtol=1e-4, atol=1e-5)
+    if num_samples > 512 * 8:
+        assert len(chunks) > 2
+
+def test_chunked_output_is_preallocated_to_full_length(write_wav):
+    path = write_wav(512 * 37 + 301, channels=2)
+    mel = audio_parser.extract_mel_spectrogram_chunked(path, chunk_frames=8)
+    assert torch.allclose(mel, audio_parser.extract_mel_spectrogram(path), rtol=1e-4, atol=1e-5)
+
+def test_chunked_rejects_a_frame_count_the_header_doesnt_match(write_wav, monkeypatch):
+    path = write_wav(512 * 37 + 301)
+    real_info = audio_parser.sf.info
+
+    def lying_info(wav_path, samples):
+        info = real_info(wav_path)
+        monkeypatch.setattr(info, "frames", samples, raising=False)
+        return info
+
+    for samples in (512 * 30, 512 * 45):
+        monkeypatch.setattr(audio_parser.sf, "info", lambda p, samples=samples: lying_info(p, samples))
+        with pytest.raises(ValueError, match=os.path.basename(path)):
+            audio_parser.extract_mel_spectrogram_chunked(path, chunk_frames=8)
@@ -0,0 +1,65 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("torch")
+
+from evaluate import match_events
+
+def match(refs, ests, tolerance, ref_groups=None, est_groups=None):
+    refs, ests = np.array(refs, dtype=np.int64), np.array(ests, dtype=np.int64)
+    ref_groups = np.zeros(len(refs), dtype=np.int64) if ref_groups is None else np.array(ref_groups, dtype=np.int64)
+    est_groups = np.zeros(len(ests), dtype=np.int64) if est_groups is None else np.array(est_groups, dtype=np.int64)
+    return match_events(refs, ref_groups, ests, est_groups, tolerance)
+
+def max_matching(refs, ests, tolerance):
+    # Plain augmenting-path bipartite matching, for cross-checking
+    owner = {}
+
+    def augment(j, seen):
+        for i, ref in enumerate(refs):
+            if abs(ref - ests[j]) <= tolerance and i not in seen:
+                seen.add(i)
+                if i not in owner or augment(owner[i], seen):
+                    owner[i] = j
+                    return True
+        return False
+
+    return sum(augment(j, set()) for j in range(len(ests)))
+
+def test_loser_falls_back_to_other_neighbour():
+    ref_hit, est_hit = match([11, 13], [10, 12], tolerance=1)
+    assert ref_hit.tolist() == [True, True]
+    assert est_hit.tolist() == [True, True]
+
+def test_two_estimates_tied_on_one_reference():
+    ref_hit, est_hit = match([10], [9, 11], tolerance=1)
+    assert ref_hit.sum() == 1
+    assert est_hit.sum() == 1
+
+def test_closest_first_would_lose_a_hit():
+    # Pairing 2 with its closest ref 3 would leave 4 unmatched
+    ref_hit, est_hit = match([0, 3], [2, 4], tolerance=2)
+    assert ref_hit.all() and est_hit.all()
+
+def test_exact_tolerance_and_outside():
+    ref_hit, est_hit = match([5, 20], [4, 17], tolerance=1)
+    assert ref_hit.tolist() == [True, False]
+    assert est_hit.tolist() == [True, False]
+
+def test_groups_never_match_each_other():
+    ref_hit, est_hit = match([5, 5], [5, 6], tolerance=1, ref_groups=[0, 1], est_groups=[1, 2])
+    assert ref_hit.tolist() == [False, True]
+    assert est_hit.tolist() == [True, False]
+
+def test_empty_inputs():
+    ref_hit, est_hit = match([], [3], tolerance=1)
+    assert len(ref_hit) == 0 and est_hit.tolist() == [False]
+
+@pytest.mark.parametrize("seed", range(20))
+def test_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    refs = rng.choice(60, size=rng.integers(0, 25), replace=False)
+    ests = rng.integers(0, 60, size=rng.integers(0, 25))
+    tolerance = int(rng.integers(0, 3))
+    ref_hit, est_hit = match(refs, ests, tolerance)
+    assert ref_hit.sum() == est_hit.sum() == max_matching(refs.tolist(), ests.tolist(), tolerance)
@@ -0,0 +1,25 @@
+import os
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("librosa")
+pytest.importorskip("torchaudio")
+
+from taiko_cli import load_script
+import generate
+
+tja_index = load_script("parser/tja-index.py")
+
+def test_song_timing_comes_from_the_catalog(tmp_path):
+    db = str(tmp_path / "catalog.sqlite")
+    conn = tja_index.open_catalog(db)
+    with conn:
+        conn.execute("INSERT INTO songs (path, mtime, bpm, offset, wave) VALUES (?, 0, 150, -0.25, 'audio.ogg')",
+                     (str(tmp_path / "song" / "song.tja"),))
+        conn.execute("INSERT INTO songs (path, mtime, bpm, wave) VALUES (?, 0, NULL, 'other.ogg')",
+                     (str(tmp_path / "other" / "other.tja"),))
+    conn.close()
+
+    key = os.path.normcase(str(tmp_path / "song" / "audio"))
+    assert generate.load_song_timing(db) == {key: {"bpm": 150.0, "offset": -0.25}}
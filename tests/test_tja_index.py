@@ -0,0 +1,32 @@
+from taiko_cli import load_script
+
+tja_index = load_script("parser/tja-index.py")
+
+def test_course_and_level_carry_over_double_play():
+    text = "\n".join([
+        "TITLE:Song", "BPM:150",
+        "COURSE:Hard", "LEVEL:6", "STYLE:Double",
+        "#START P1", "1111,", "#END",
+        "#START P2", "2222,", "#END",
+        "COURSE:Oni", "LEVEL:9",
+        "#START", "1,", "#END",
+    ])
+    song, courses = tja_index.parse_tja_metadata(text)
+    assert song == {"title": "Song", "bpm": 150.0}
+    assert courses == [
+        {"course": "Hard", "level": 6, "notes": 4},
+        {"course": "Hard", "level": 6, "notes": 4},
+        {"course": "Oni", "level": 9, "notes": 1},
+    ]
+
+def test_notes_count_one_branch():
+    text = "\n".join([
+        "COURSE:3", "LEVEL:10",
+        "#START", "1000,",
+        "#BRANCHSTART p,10,20",
+        "#N", "1111,", "#E", "2222,", "#M", "3300,",
+        "#BRANCHEND", "1,",
+        "#END",
+    ])
+    _, courses = tja_index.parse_tja_metadata(text)
+    assert courses == [{"course": "Oni", "level": 10, "notes": 4}]
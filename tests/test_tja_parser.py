@@ -0,0 +1,54 @@
+from taiko_cli import load_script
+
+tja_parser = load_script("parser/tja-parser.py")
+
+def write_chart(tmp_path, body, header="BPM:120\nOFFSET:0\n"):
+    path = tmp_path / "song.tja"
+    path.write_text(header + "COURSE:Oni\nLEVEL:8\n#START\n" + body + "\n#END\n", encoding="utf-8")
+    return path
+
+def test_plain_chart_timing(tmp_path):
+    path = write_chart(tmp_path, "1020,\n#BPMCHANGE 240\n11,\n,\n1,")
+    [(course, events)] = tja_parser.parse_tja_events(path)
+    assert course == "Oni"
+    assert events == [(0.0, 1), (1.0, 2), (2.0, 1), (2.5, 1), (4.0, 1)]
+
+def test_only_master_branch_is_kept(tmp_path):
+    path = write_chart(tmp_path, "1000,\n#BRANCHSTART p,10,20\n#N\n1111,\n#E\n2222,\n#M\n3333,\n#BRANCHEND\n1,")
+    [(_, events)] = tja_parser.parse_tja_events(path)
+    assert events == [(0.0, 1), (2.0, 3), (2.5, 3), (3.0, 3), (3.5, 3), (4.0, 1)]
+
+def test_chart_continues_from_end_of_kept_branch(tmp_path):
+    # The other branches change tempo and length; only the master branch's timing counts.
+    # The second section has no #BRANCHEND, and the master branch comes first in it.
+    body = "\n".join([
+        "#BRANCHSTART p,10,20",
+        "#N", "#BPMCHANGE 60", "1,", "1,",
+        "#E", "#MEASURE 2/4", "2,",
+        "#M", "3,",
+        "#BRANCHSTART p,10,20",
+        "#M", "4,",
+        "#N", "#BPMCHANGE 30", "1,",
+        "#BRANCHEND",
+        "1,",
+    ])
+    [(_, events)] = tja_parser.parse_tja_events(write_chart(tmp_path, body))
+    assert events == [(0.0, 3), (2.0, 4), (4.0, 1)]
+
+def test_offset_shifts_every_note(tmp_path):
+    path = write_chart(tmp_path, "1,\n#BRANCHSTART p,10,20\n#N\n1,\n#M\n2,\n#BRANCHEND\n1,", header="BPM:120\nOFFSET:-1\n")
+    [(_, events)] = tja_parser.parse_tja_events(path)
+    assert events == [(1.0, 1), (3.0, 2), (5.0, 1)]
+
+def test_course_names_are_normalized(tmp_path):
+    path = tmp_path / "song.tja"
+    path.write_text("BPM:120\n"
+                    "COURSE:3\n#START\n1,\n#END\n"
+                    "COURSE:ura\n#START\n2,\n#END\n"
+                    "COURSE:Tower\n#START\n1,\n#END\n", encoding="utf-8")
+    assert [course for course, _ in tja_parser.parse_tja_events(path)] == ["Oni", "Edit"]
+
+def test_chart_without_course_is_oni(tmp_path):
+    path = tmp_path / "song.tja"
+    path.write_text("BPM:120\n#START\n1,\n#END\n", encoding="utf-8")
+    assert [course for course, _ in tja_parser.parse_tja_events(path)] == ["Oni"]
@@ -0,0 +1,8 @@
+from taiko_cli import load_script
+
+verify_files = load_script("scripts/verify-files.py")
+
+def test_wave_names_from_shift_jis_tja(tmp_path):
+    path = tmp_path / "song.tja"
+    path.write_bytes("TITLE:夜桜\nWAVE:夜桜お七.ogg\nCOURSE:Oni\n#START\n1,\n#END\n".encode("cp932"))
+    assert verify_files.extract_ogg_names_from_tja(str(path)) == {"夜桜お七.ogg"}